@@ -1,4 +1,7 @@
 
+# The statistics of each model fit reported by get_fit_stats().
+FIT_STATS = ['converged', 'function-evals', 'gradient-evals', 'iterations', 'loss', 'seconds']
+
 class Algorithm():
     """
     This is the base class for all implemented algorithms.  New algorithms should extend this
@@ -29,6 +32,27 @@ class Algorithm():
         """
         raise NotImplementedError("run() in Algorithm is not implemented")
 
+    def run_param_path(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
+                       single_sensitive, privileged_vals, param_name, param_vals):
+        """
+        Optionally runs the algorithm once for each of the given values of the named parameter in
+        a single call, and returns the list of predicted classifications for each value in the
+        given order.  This should only be implemented if the runs can share work, e.g., by
+        starting each fit from the previous one.  If not implemented by a specific algorithm, this
+        returns None and ParamGridSearch calls run() once per value instead.
+        """
+        return None
+
+    def get_fit_stats(self):
+        """
+        Returns the statistics of the model fits done by the last call to run() or
+        run_param_path(), as a list of (params, stats) pairs: the parameters of each fit and a
+        dictionary mapping the names in FIT_STATS to its values.  This should only be implemented
+        by algorithms that train their models with an iterative optimizer, so that its cost can be
+        tuned.  If not implemented by a specific algorithm, this returns the empty list.
+        """
+        return []
+
     def get_param_info(self):
         """
         Returns a dictionary mapping algorithm parameter names to a list of parameter values to
@@ -1,6 +1,8 @@
 import math
 
 from fairness.algorithms.Algorithm import Algorithm
+from fairness.metrics.ConfusionCounts import calc_metrics, stack_predictions
+from fairness.metrics.SensitiveGroups import get_sensitive_groups
 
 class ParamGridSearch(Algorithm):
     def __init__(self, algorithm, metric):
@@ -9,6 +11,7 @@ class ParamGridSearch(Algorithm):
         self.name = algorithm.get_name() + "-" + metric.get_name()
         # The single metric that will be optimized to for each run of this grid search
         self.metric = metric
+        self.fit_stats = []
 
     def run(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
             single_sensitive, privileged_vals, params):
@@ -19,10 +22,20 @@ class ParamGridSearch(Algorithm):
         returned by mutating the given dictionary.
         """
         all_predictions = []
+        self.fit_stats = []
         search_space = self.algorithm.get_param_info()
         for param_name in search_space:
              ## Note: this only maximizes one parameter at a time - if the maximum involves
              ## two parameters being set, this will not find it.
+             path_predictions = self.run_param_path(train_df, test_df, class_attr,
+                                                    positive_class_val, sensitive_attrs,
+                                                    single_sensitive, privileged_vals, param_name,
+                                                    search_space[param_name])
+             if path_predictions is not None:
+                  self.fit_stats.extend(self.algorithm.get_fit_stats())
+                  for param_val, predictions in zip(search_space[param_name], path_predictions):
+                      all_predictions.append( (param_name, param_val, predictions) )
+                  continue
              for param_val in search_space[param_name]:
                   trial_params = { param_name : param_val }
                   try:
@@ -30,6 +43,7 @@ class ParamGridSearch(Algorithm):
                           self.algorithm.run(train_df, test_df, class_attr, positive_class_val,
                                              sensitive_attrs, single_sensitive, privileged_vals,
                                              trial_params)
+                      self.fit_stats.extend(self.algorithm.get_fit_stats())
                       all_predictions.append( (param_name, param_val, predictions) )
                   except Exception as e:
                       print("run for parameters %s failed: %s" % (params, e))
@@ -38,23 +52,48 @@ class ParamGridSearch(Algorithm):
                                           privileged_vals, params)
         return best_predictions, all_predictions
 
+    def run_param_path(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
+                       single_sensitive, privileged_vals, param_name, param_vals):
+        """
+        Returns the predictions of the algorithm's run_param_path() for the given parameter
+        values, or None if it does not implement one or it failed, so that each value is run on
+        its own.
+        """
+        try:
+            return self.algorithm.run_param_path(train_df, test_df, class_attr,
+                                                 positive_class_val, sensitive_attrs,
+                                                 single_sensitive, privileged_vals, param_name,
+                                                 param_vals)
+        except Exception as e:
+            print("run of the path of parameter %s failed: %s" % (param_name, e))
+            return None
+
+    def get_fit_stats(self):
+        """
+        Returns the statistics of the model fits of all runs of the last grid search.
+        """
+        return self.fit_stats
+
     def find_best(self, all_predictions, train_df, test_df, class_attr, positive_class_val,
                   sensitive_attrs, single_sensitive, privileged_vals, params):
         if len(all_predictions) == 0:
             raise Exception(
                 "No run in the parameter grid search succeeded - failing run of algorithm")
         actual = test_df[class_attr]
-        dict_sensitive = {}
-        for sens in sensitive_attrs:
-             dict_sensitive[sens] = test_df[sens].values.tolist()
+        sensitive_groups = get_sensitive_groups(test_df, sensitive_attrs)
+
+        # the metric is calculated for all of the predictions at once, as a matrix with one row
+        # of predictions per parameter setting
+        predictions_matrix = \
+            stack_predictions([predictions for _, _, predictions in all_predictions])
+        metric_vals = calc_metrics([self.metric], actual, predictions_matrix, sensitive_groups,
+                                   single_sensitive, privileged_vals, positive_class_val)
 
         best_val = None
         best = None
         best_name = None
         best_metric = None
-        for param_name, param_val, predictions in all_predictions:
-             val = self.metric.calc(actual, predictions, dict_sensitive, single_sensitive,
-                                    privileged_vals, positive_class_val)
+        for (param_name, param_val, predictions), (val,) in zip(all_predictions, metric_vals):
              if best_val == None or self.metric.is_better_than(val, best_metric):
                   best = predictions
                   best_name = param_name
@@ -1,22 +1,33 @@
 from fairness.algorithms.Algorithm import Algorithm
 import numpy
-import tempfile
-import os
-import subprocess
+import pandas
+
+from fadm.nb.cv2nb import CaldersVerwerTwoNaiveBayes
 
 class CaldersAlgorithm(Algorithm):
     """
     Notes:
 
-    - The original code depends on python2's commands library. We hacked
-    it to have python3 support by adding a minimal commands.py module with
+    - Calders and Verwer's two naive Bayes (fadm.nb.cv2nb.CaldersVerwerTwoNaiveBayes) is trained
+    and evaluated in this process, in the same way as the original train_cv2nb.py and
+    predict_nb.py scripts do it, but on in-memory arrays instead of space-separated files.
+
+    - By default the joint counts of the class and the sensitive attribute are modified by the
+    fixed steps of the original method until the discrimination on the training set is removed.
+    With search='bisect' the amounts to modify them by are searched by bisection instead.
+
+    - The original scripts depend on python2's commands library. We hacked
+    them to have python3 support by adding a minimal commands.py module with
     a getoutput function.
 
     """
 
-    def __init__(self):
+    def __init__(self, search='step', name=None):
         Algorithm.__init__(self)
-        self.name = "Calders"
+        self.search = search
+        if name is None:
+            name = "Calders" if search == 'step' else "Calders-" + search
+        self.name = name
 
     def run(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
             single_sensitive, privileged_vals, params):
@@ -24,103 +35,50 @@ class CaldersAlgorithm(Algorithm):
         if not 'beta' in params:
             params = self.get_default_params()
 
+        predictions_list = self.run_beta_path(train_df, test_df, class_attr, sensitive_attrs,
+                                              single_sensitive, [params['beta']])
+        return predictions_list[0], []
+
+    def run_param_path(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
+                       single_sensitive, privileged_vals, param_name, param_vals):
+        """
+        Trains the models for all of the given values of beta on the same encoding of the data
+        (see run_beta_path()).
+        """
+        if param_name != 'beta':
+            return None
+        return self.run_beta_path(train_df, test_df, class_attr, sensitive_attrs,
+                                  single_sensitive, param_vals)
+
+    def run_beta_path(self, train_df, test_df, class_attr, sensitive_attrs, single_sensitive,
+                      betas):
+        """
+        Returns the list of predictions of the models for the given values of beta.  The data is
+        encoded once and shared by all of the models.
+        """
         value_0 = train_df[class_attr].values[0]
         if type(value_0) == str:
             class_type = str
         else:
             class_type = type(value_0.item()) # this should be numpy.int64 or numpy.int32,
 
-        def create_file_in_calders_format(df, dicts):
-            y = df[class_attr]
-            s = df[single_sensitive]
-
-            x = []
-            
-            for col in df:
-                if col not in dicts:
-                    col_dict = {}
-                    dicts[col] = col_dict
-                else:
-                    col_dict = dicts[col]
-                # col_dict = dicts.setdefault(col, {})
-                if col == class_attr:
-                    continue
-                if col in sensitive_attrs:
-                    continue
-                values = []
-                for val in df[col].values:
-                    values.append(col_dict.setdefault(val, len(col_dict)))
-                x.append(numpy.array(values, dtype=numpy.int32))
-
-            for col in [single_sensitive, class_attr]:
-                if col not in dicts:
-                    col_dict = {}
-                    dicts[col] = col_dict
-                else:
-                    col_dict = dicts[col]
-                values = []
-                for val in df[col].values:
-                    values.append(col_dict.setdefault(val, len(col_dict)))
-                x.append(numpy.array(values, dtype=numpy.int32))
-
-            result = numpy.array(x).T
-            fd, name = tempfile.mkstemp()
-            os.close(fd)
-            numpy.savetxt(name, result, fmt='%d')
-            return name
-        
-        train_col_sets = list(set(train_df[col]) for col in train_df
-                              if col not in sensitive_attrs + [class_attr])
-        test_col_sets = list(set(test_df[col]) for col in test_df
-                             if col not in sensitive_attrs + [class_attr])
-        lengths = list(max(2, len(a.union(b))) for (a,b) in zip(train_col_sets, test_col_sets))
-        nfv = ":".join(str(l) for l in lengths)
-
-        try:
-            fd, model_name = tempfile.mkstemp()
-            os.close(fd)
-            fd, output_name = tempfile.mkstemp()
-            os.close(fd)
-            dicts = {}
-            train_name = create_file_in_calders_format(train_df, dicts)
-            test_name = create_file_in_calders_format(test_df, dicts)
-            beta_val = params['beta']
-            BASE_DIR = os.path.dirname(__file__)
-            cmdline = ['python3', BASE_DIR + '/kamfadm-2012ecmlpkdd/train_cv2nb.py',
-                            '-b', str(beta_val),
-                            '-f', nfv,
-                            '-i', train_name,
-                            '-o', model_name,
-                            '--quiet']
-            # print("WILL RUN: %s" % cmdline)
-            try:
-                result1 = subprocess.run(cmdline, timeout=600)
-                if result1.returncode != 0:
-                    raise Exception("Training procedure failed")
-            except subprocess.TimeoutExpired:
-                raise Exception("Training procedure timeout")
-            result2 = subprocess.run(['python3', BASE_DIR + '/kamfadm-2012ecmlpkdd/predict_nb.py',
-                            '-i', test_name,
-                            '-m', model_name,
-                            '-o', output_name,
-                            '--quiet'])
-            if result2.returncode != 0:
-                raise Exception("prediction procedure failed")
-
-            m = numpy.loadtxt(output_name)
-
-            inv_class_dict = dict((v,k) for (k,v) in dicts[class_attr].items())
-
-            predictions = m[:,1]
-            predictions_correct = [class_type(inv_class_dict[x]) for x in predictions]
-
-            return predictions_correct, []
-        finally:
-            pass
-            # os.unlink(train_name)
-            # os.unlink(model_name)
-            # os.unlink(test_name)
-            # os.unlink(output_name)
+        train, test, lengths, class_values = \
+            encode_in_calders_format(train_df, test_df, class_attr, sensitive_attrs,
+                                     single_sensitive)
+
+        # as train_cv2nb.py and predict_nb.py do: the class is the last column, the sensitive
+        # attribute the one before it, and the values are read as floats
+        train = train.astype(numpy.float64)
+        test = test.astype(numpy.float64)
+        predictions_list = []
+        with numpy.errstate(all='ignore'):
+            for beta in betas:
+                clr = CaldersVerwerTwoNaiveBayes(train.shape[1] - 2, lengths, beta=beta)
+                clr.fit(train[:, :-1], train[:, -1], 1, search=self.search)
+                predictions_list.append(numpy.argmax(clr.predict_proba(test[:, :-1]), axis=1))
+
+        return [[class_type(x) for x in class_values[predictions]]
+                for predictions in predictions_list]
 
     def get_supported_data_types(self):
         return set(["numerical-binsensitive"])
@@ -138,4 +96,34 @@ class CaldersAlgorithm(Algorithm):
         """
         return {'beta' : [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]}
 
-
+def encode_in_calders_format(train_df, test_df, class_attr, sensitive_attrs, single_sensitive):
+    """
+    Returns (train, test, lengths, class_values): the integer matrices of the given train and test
+    sets in the format of train_cv2nb.py, with the non-sensitive features followed by the single
+    sensitive attribute and the class, the number of values of each non-sensitive feature (which
+    train_cv2nb.py is given as its nfv option) and the array of class values, indexed by code.
+
+    Each column is encoded jointly over the train and test set, where code i stands for the i-th
+    distinct value in order of first appearance.  Missing values (NaN) share the last code, as a
+    value of their own.
+    """
+    features = [col for col in train_df
+                if col != class_attr and col not in sensitive_attrs]
+    n_train = len(train_df)
+
+    codes = []
+    lengths = []
+    for col in features + [single_sensitive, class_attr]:
+        col_codes, uniques = pandas.factorize(
+            numpy.concatenate([train_df[col].values, test_df[col].values]))
+        # factorize gives missing values the code -1, which would index the last value's counts
+        missing = col_codes == -1
+        if missing.any():
+            col_codes = numpy.where(missing, len(uniques), col_codes)
+            uniques = numpy.append(uniques, numpy.nan)
+        codes.append(col_codes)
+        lengths.append(max(2, len(uniques)))
+    class_values = uniques
+
+    matrix = numpy.column_stack(codes).astype(numpy.int32)
+    return matrix[:n_train], matrix[n_train:], lengths[:len(features)], class_values
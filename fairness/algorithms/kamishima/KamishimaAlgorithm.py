@@ -1,20 +1,26 @@
 from fairness.algorithms.Algorithm import Algorithm
 import numpy
-import tempfile
-import os
-import subprocess
+
+from fadm.lr.pr import LRwPRType4
+from fadm.util import fill_missing_with_mean
 
 class KamishimaAlgorithm(Algorithm):
     """
     Notes:
 
-    - The original code depends on python2's commands library. We hacked
-    it to hve python3 support by adding a minimal commands.py module with
-    a getoutput function.
+    - The prejudice remover (fadm.lr.pr.LRwPRType4) is trained and evaluated in this process, in
+    the same way as the original train_pr.py and predict_lr.py scripts do it, but on in-memory
+    arrays instead of space-separated files.
 
-    ## Getting train_pr to work
+    - By default it is trained by conjugate gradient with at most 100 iterations, as train_pr.py
+    does.  The optimizer can be chosen instead, one of 'cg', 'lbfgs' (L-BFGS-B), 'newton'
+    (trust-region Newton) or 'sgd' (mini-batch stochastic gradient descent, see
+    LRwPRType4.fit_stochastic(), for large datasets), along with its tolerance and maximum number
+    of iterations (of epochs for 'sgd'); the statistics of each fit are reported by
+    get_fit_stats().  The name of the algorithm includes the optimizer if it is not the default,
+    so pass a name to compare other settings.
 
-    It takes as input a space-separated file.
+    ## Getting LRwPRType4 to work
 
     Its value imputation is quite naive (replacing nans with column
     means), so we will impute values ourselves ahead of time if necessary.
@@ -33,16 +39,22 @@ class KamishimaAlgorithm(Algorithm):
     - the second-to-last column of the input should be the sensitive feature (as integer values)
     - fill missing values ahead of time in order to avoid imputation.
 
-    If you do this, train_pr.py:148-149 will take the last column to be y
-    (the target classes to predict), then pr.py:264 will take the
+    If you do this, train_pr.py:148-149 (and run() below) will take the last
+    column to be y (the target classes to predict), then pr.py:264 will take the
     second-to-last column as the sensitive attribute, and pr.py:265-268
     will take the remaining columns as non-sensitive.
 
     """
 
-    def __init__(self):
+    def __init__(self, optimizer='cg', tol=None, maxiter=None, name=None):
         Algorithm.__init__(self)
-        self.name = "Kamishima"
+        self.optimizer = optimizer
+        self.tol = tol
+        self.maxiter = maxiter
+        self.fit_stats = []
+        if name is None:
+            name = "Kamishima" if optimizer == 'cg' else "Kamishima-" + optimizer
+        self.name = name
 
     def run(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
             single_sensitive, privileged_vals, params):
@@ -50,9 +62,31 @@ class KamishimaAlgorithm(Algorithm):
         if not 'eta' in params:
             params = self.get_default_params()
 
+        predictions_list = self.run_eta_path(train_df, test_df, class_attr, sensitive_attrs,
+                                             single_sensitive, [params['eta']])
+        return predictions_list[0], []
+
+    def run_param_path(self, train_df, test_df, class_attr, positive_class_val, sensitive_attrs,
+                       single_sensitive, privileged_vals, param_name, param_vals):
+        """
+        Trains the models for all of the given values of eta as one path (see run_eta_path()),
+        sharing the data preparation and the initialization between them.
+        """
+        if param_name != 'eta':
+            return None
+        return self.run_eta_path(train_df, test_df, class_attr, sensitive_attrs,
+                                 single_sensitive, param_vals)
+
+    def run_eta_path(self, train_df, test_df, class_attr, sensitive_attrs, single_sensitive,
+                     etas):
+        """
+        Returns the list of predictions of the models for the given values of eta.  The models are
+        trained in increasing order of eta, the first from the initialization of train_pr.py and
+        each of the others from the coefficients of the model for the previous eta.
+        """
         class_type = type(train_df[class_attr].values[0].item())
 
-        def create_file_in_kamishima_format(df):
+        def create_matrix_in_kamishima_format(df):
             y = df[class_attr]
             s = df[single_sensitive]
 
@@ -67,42 +101,48 @@ class KamishimaAlgorithm(Algorithm):
             x.append(numpy.array(s, dtype=numpy.float64))
             x.append(numpy.array(df[class_attr], dtype=numpy.float64))
 
-            result = numpy.array(x).T
-            fd, name = tempfile.mkstemp()
-            os.close(fd)
-            numpy.savetxt(name, result)
-            return name
-
-        fd, model_name = tempfile.mkstemp()
-        os.close(fd)
-        fd, output_name = tempfile.mkstemp()
-        os.close(fd)
-        train_name = create_file_in_kamishima_format(train_df)
-        test_name = create_file_in_kamishima_format(test_df)
-        eta_val = params['eta']
-
-        BASE_DIR = os.path.dirname(__file__)
-        subprocess.run(['python3', BASE_DIR + '/kamfadm-2012ecmlpkdd/train_pr.py',
-                        '-e', str(eta_val),
-                        '-i', train_name,
-                        '-o', model_name,
-                        '--quiet'])
-        subprocess.run(['python3', BASE_DIR + '/kamfadm-2012ecmlpkdd/predict_lr.py',
-                        '-i', test_name,
-                        '-m', model_name,
-                        '-o', output_name,
-                        '--quiet'])
-        os.unlink(train_name)
-        os.unlink(model_name)
-        os.unlink(test_name)
-
-        m = numpy.loadtxt(output_name)
-        os.unlink(output_name)
-
-        predictions = m[:,1]
-        predictions_correct = [class_type(x) for x in predictions]
-
-        return predictions_correct, []
+            # row-major, like the matrix that train_pr.py and predict_lr.py load
+            return numpy.ascontiguousarray(numpy.array(x).T)
+
+        train = create_matrix_in_kamishima_format(train_df)
+        test = create_matrix_in_kamishima_format(test_df)
+
+        # as train_pr.py and predict_lr.py do with their default options: C = 1.0, one sensitive
+        # feature, and coefficients initialized by logistic regression on each sensitive value
+        with numpy.errstate(all='ignore'):
+            train_X = fill_missing_with_mean(train[:, :-1])
+            if self.optimizer == 'sgd':
+                models = [self.fit_stochastic(train_X, train[:, -1], eta) for eta in etas]
+            else:
+                options = {}
+                if self.maxiter is not None:
+                    options['maxiter'] = self.maxiter
+                clr = LRwPRType4(C=1.0)
+                models = clr.fit_path(train_X, train[:, -1], etas, 1, itype=3,
+                                      optimizer=self.optimizer, tol=self.tol, **options)
+            test_X = fill_missing_with_mean(test[:, :-1])
+            predictions_list = [model.predict(test_X) for model in models]
+
+        self.fit_stats = [({ 'eta' : eta }, get_model_fit_stats(model))
+                          for eta, model in zip(etas, models)]
+
+        return [[class_type(x) for x in predictions] for predictions in predictions_list]
+
+    def fit_stochastic(self, X, y, eta):
+        """
+        Returns the model for the given eta trained by mini-batch stochastic gradient descent,
+        with the chunks in the same order in every run so that results are reproducible.
+        """
+        options = {}
+        if self.maxiter is not None:
+            options['n_epochs'] = self.maxiter
+        if self.tol is not None:
+            options['tol'] = self.tol
+        return LRwPRType4(eta=eta, C=1.0).fit_stochastic(X, y, 1, itype=3, random_state=0,
+                                                         **options)
+
+    def get_fit_stats(self):
+        return self.fit_stats
 
     def get_supported_data_types(self):
         return set(["numerical-binsensitive"])
@@ -122,3 +162,15 @@ class KamishimaAlgorithm(Algorithm):
         return {'eta' : [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 100.0,
                          150.0, 200.0, 250.0, 300.0] }
 
+def get_model_fit_stats(model):
+    """
+    Returns the statistics of the fit of the given trained LRwPRType4 model, by the names in
+    FIT_STATS.
+    """
+    stats = model.fit_stats_
+    return { 'converged' : int(stats['success']),
+             'function-evals' : stats['nfev'],
+             'gradient-evals' : stats['njev'],
+             'iterations' : stats['nit'],
+             'loss' : model.f_loss_,
+             'seconds' : stats['seconds'] }
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The algorithms in this package call the fadm package of Kamishima's code directly, so its
+# directory (which is not a package name) is put on the path.
+KAMFADM_DIR = os.path.join(os.path.dirname(__file__), 'kamfadm-2012ecmlpkdd')
+if KAMFADM_DIR not in sys.path:
+    sys.path.append(KAMFADM_DIR)
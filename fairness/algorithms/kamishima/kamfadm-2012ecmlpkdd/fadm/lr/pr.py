@@ -14,6 +14,12 @@ N_S : int
     the number of sensitive features
 N_CLASSES : int
     the number of classes
+OPTIMIZERS : dict
+    methods of scipy.optimize.minimize used to train models, by their names
+BATCH_SIZE : int
+    default number of samples in a chunk for stochastic training
+N_EPOCHS : int
+    default maximum number of passes over the samples in stochastic training
 """
 
 from __future__ import print_function
@@ -28,9 +34,11 @@ from __future__ import unicode_literals
 # Imports
 #==============================================================================
 
+import copy
 import logging
+import time
 import numpy as np
-from scipy.optimize import fmin_cg
+from scipy.optimize import minimize
 from sklearn.linear_model import LogisticRegression
 from sklearn.base import BaseEstimator, ClassifierMixin
 
@@ -48,6 +56,9 @@ EPSILON = 1.0e-10
 SIGMOID_RANGE = np.log((1.0 - EPSILON) / EPSILON)
 N_S = 1
 N_CLASSES = 2
+OPTIMIZERS = {'cg': 'CG', 'lbfgs': 'L-BFGS-B', 'newton': 'trust-ncg'}
+BATCH_SIZE = 1000
+N_EPOCHS = 20
 
 #==============================================================================
 # Module variables
@@ -77,6 +88,77 @@ def sigmoid(x, w):
 
     return 1.0 / (1.0 + np.exp(-s))
 
+def sigmoid_rows(X, W, s):
+    """ sigmoid(W[s[i], :]^T X[i, :]) for all samples at once
+    To suppress the warnings at np.exp, do "np.seterr(all='ignore')"
+
+    Parameters
+    ----------
+    X : array, shape=(n_samples, d)
+        input vectors
+    W : array, shape=(n_sfv, d)
+        weights, one row for each value of the sensitive feature
+    s : array, shape=(n_samples), dtype=int
+        values of the sensitive feature
+
+    -------
+    sigmoid : array, shape=(n_samples)
+        sigmoid(W[s[i], :]^T X[i, :]) for each sample i
+    """
+
+    # one matrix product for all the weights, of which each sample keeps its
+    # own one
+    s = np.dot(X, W.T)[np.arange(X.shape[0]), s]
+    s = np.clip(s, -SIGMOID_RANGE, SIGMOID_RANGE)
+
+    return 1.0 / (1.0 + np.exp(-s))
+
+def sensitive_indicator(s, n_sfv):
+    """ indicator matrix of the values of the sensitive feature
+
+    Parameters
+    ----------
+    s : array, shape=(n_samples), dtype=int
+        values of the sensitive feature
+    n_sfv : int
+        the number of sensitive feature values
+
+    -------
+    indicator : array, shape=(n_sfv, n_samples)
+        indicator[si, i] is 1 if s[i] == si and 0 otherwise, so that
+        np.dot(indicator, A) sums the rows of A for each sensitive value
+    """
+
+    return (s[np.newaxis, :] == np.arange(n_sfv)[:, np.newaxis]).astype(float)
+
+def split_sensitive(X, ns, fit_intercept):
+    """ separate the sensitive feature from the other features, as `fit`
+    does
+
+    Parameters
+    ----------
+    X : array, shape=(n_samples, n_features)
+        feature vectors of samples, the sensitive feature at -ns
+    ns : int
+        number of sensitive features. currently fixed to N_S
+    fit_intercept : bool
+        add a constant term
+
+    -------
+    X : array, shape=(n_samples, n_nsf)
+        non-sensitive features, followed by a constant if fit_intercept
+    s : array, shape=(n_samples), dtype=int
+        values of the sensitive feature
+    """
+
+    s = np.atleast_1d(np.squeeze(np.array(X)[:, -ns]).astype(int))
+    if fit_intercept:
+        X = np.c_[np.atleast_2d(X)[:, :-ns], np.ones(X.shape[0])]
+    else:
+        X = np.atleast_2d(X)[:, :-ns]
+
+    return X, s
+
 
 #==============================================================================
 # Classes
@@ -177,8 +259,7 @@ class LRwPRPredictProbaType2Mixin(LRwPR):
         coef = self.coef_.reshape(self.n_sfv_, self.n_features_)
 
         proba = np.empty((X.shape[0], N_CLASSES))
-        proba[:, 1] = [sigmoid(X[i, :], coef[s[i], :])
-                       for i in range(X.shape[0])]
+        proba[:, 1] = sigmoid_rows(X, coef, s)
         proba[:, 0] = 1.0 - proba[:, 1]
 
         return proba
@@ -243,7 +324,7 @@ class LRwPRFittingType1Mixin(LRwPR):
         else:
             raise typeError
 
-    def fit(self, X, y, ns=N_S, itype=0, **kwargs):
+    def fit(self, X, y, ns=N_S, itype=0, optimizer='cg', tol=None, **kwargs):
         """ train this model
 
         Parameters
@@ -256,8 +337,48 @@ class LRwPRFittingType1Mixin(LRwPR):
             number of sensitive features. currently fixed to N_S
         itype : int
             type of initialization method
+        optimizer : str
+            name of the optimizer, one of the keys of OPTIMIZERS
+        tol : float, optional
+            tolerance of the optimizer
         kwargs : any
-            arguments to optmizer
+            options of the optimizer
+        """
+
+        self.fit_path(X, y, [self.eta], ns, itype, optimizer, tol, **kwargs)
+
+    def fit_path(self, X, y, etas, ns=N_S, itype=0, optimizer='cg', tol=None,
+                 **kwargs):
+        """ train models for a sequence of fairness penalty parameters
+
+        The models are trained in increasing order of eta.  Only the first one
+        is initialized as specified by `itype`; each of the others starts from
+        the coefficients of the model for the previous eta.
+
+        Parameters
+        ----------
+        X : array, shape = (n_samples, n_features)
+            feature vectors of samples
+        y : array, shape = (n_samples)
+            target class of samples
+        etas : array-like
+            values of the penalty parameter eta
+        ns : int
+            number of sensitive features. currently fixed to N_S
+        itype : int
+            type of initialization method
+        optimizer : str
+            name of the optimizer, one of the keys of OPTIMIZERS
+        tol : float, optional
+            tolerance of the optimizer
+        kwargs : any
+            options of the optimizer
+
+        Returns
+        -------
+        models : list
+            trained copies of this model, one for each eta in the given order.
+            this model itself is left trained for the largest eta.
         """
 
         # rearrange input arguments
@@ -281,16 +402,224 @@ class LRwPRFittingType1Mixin(LRwPR):
         self.n_features_ = X.shape[1]
         self.n_samples_ = X.shape[0]
 
-        # optimization
+        # optimization, each eta starting from the coefficients of the last
         self.init_coef(itype, X, y, s)
-        self.coef_ = fmin_cg(self.loss,
-                             self.coef_,
-                             fprime=self.grad_loss,
-                             args=(X, y, s),
-                             **kwargs)
+        models = {}
+        for eta in sorted(set(etas)):
+            self.eta = eta
+            self.minimize_loss(X, y, s, optimizer, tol, kwargs)
+
+            # get final loss
+            self.f_loss_ = self.loss(self.coef_, X, y, s)
+            models[eta] = copy.copy(self)
+
+        return [models[eta] for eta in etas]
+
+    def minimize_loss(self, X, y, s, optimizer, tol, options):
+        """ optimize the coefficients, starting from the current ones
 
-        # get final loss
-        self.f_loss_ = self.loss(self.coef_, X, y, s)
+        The statistics of the optimization are stored in `fit_stats_`, a dict
+        with the name of the optimizer, the numbers of iterations (nit), loss
+        evaluations (nfev) and gradient evaluations (njev), whether it
+        converged (success), and the time it took in seconds.
+
+        The trust-region Newton optimizer approximates products of the Hessian
+        and a vector by finite differences of the analytic gradient, and the
+        gradient evaluations for them are included in njev.
+
+        Parameters
+        ----------
+        X : array, shape = (n_samples, n_features)
+            feature vectors of samples
+        y : array, shape = (n_samples)
+            target class of samples
+        s : array, shape=(n_samples)
+            values of sensitive features
+        optimizer : str
+            name of the optimizer, one of the keys of OPTIMIZERS
+        tol : float or None
+            tolerance of the optimizer
+        options : dict
+            options of the optimizer
+        """
+
+        if not optimizer in OPTIMIZERS:
+            raise ValueError("unknown optimizer: " + str(optimizer))
+
+        hessp = None
+        hessp_njev = [0]
+        if optimizer == 'newton':
+            grad_at = {}
+
+            def hessp(coef, p, X, y, s):
+                key = coef.tobytes()
+                if not key in grad_at:
+                    grad_at.clear()
+                    grad_at[key] = self.grad_loss(coef, X, y, s)
+                    hessp_njev[0] += 1
+                h = np.sqrt(np.finfo(float).eps) * \
+                    (1.0 + np.linalg.norm(coef)) / max(np.linalg.norm(p), EPSILON)
+                hessp_njev[0] += 1
+                return (self.grad_loss(coef + h * p, X, y, s) - grad_at[key]) / h
+
+        start = time.time()
+        res = minimize(self.loss,
+                       self.coef_,
+                       args=(X, y, s),
+                       method=OPTIMIZERS[optimizer],
+                       jac=self.grad_loss,
+                       hessp=hessp,
+                       tol=tol,
+                       options=options)
+        self.coef_ = res.x
+        self.fit_stats_ = {'optimizer': optimizer,
+                           'nit': res.get('nit', 0),
+                           'nfev': res.get('nfev', 0),
+                           'njev': res.get('njev', 0) + hessp_njev[0],
+                           'success': bool(res.success),
+                           'seconds': time.time() - start}
+
+    def fit_stochastic(self, X, y, ns=N_S, itype=0, batch_size=BATCH_SIZE,
+                       n_epochs=N_EPOCHS, learning_rate=0.01, decay=0.9,
+                       tol=1.0e-4, random_state=None):
+        """ train this model by mini-batch stochastic gradient descent
+
+        The samples are read in chunks of `batch_size` consecutive rows, the
+        chunks in a random order in each epoch, so that X and y can be
+        memory-mapped arrays (e.g. from np.load(..., mmap_mode='r')) that do
+        not fit in memory.  rho(s), pi and their derivatives, which are sums
+        over all samples, are replaced by running estimates: sums over the
+        chunks seen so far, each chunk's weight decayed by `decay` for every
+        later chunk.  The coefficients are updated by AdaGrad with the given
+        learning rate, and training stops early once an epoch changes them by
+        less than `tol` relative to their norm.  (The stopping rule does not
+        use the loss, since `grad_loss` of the fairness-aware regularizer is
+        not the exact derivative of `loss`.)
+
+        Initialization types 2 and 3 learn from the first chunk only.  The
+        statistics of the training are stored in `fit_stats_` as by
+        `minimize_loss`, counting one gradient evaluation per chunk,
+        and `f_loss_` is the loss over all samples, computed by a final pass.
+
+        Parameters
+        ----------
+        X : array, shape = (n_samples, n_features)
+            feature vectors of samples
+        y : array, shape = (n_samples)
+            target class of samples
+        ns : int
+            number of sensitive features. currently fixed to N_S
+        itype : int
+            type of initialization method
+        batch_size : int
+            number of samples in a chunk
+        n_epochs : int
+            maximum number of passes over the samples
+        learning_rate : float
+            learning rate of AdaGrad
+        decay : float
+            weight of the running estimates kept per chunk
+        tol : float
+            relative change of the coefficients in an epoch to keep training
+        random_state : int or RandomState, optional
+            random number generator of the order of the chunks
+
+        Returns
+        -------
+        self : object
+            this model
+        """
+
+        start = time.time()
+        rng = np.random.RandomState(random_state) \
+            if not isinstance(random_state, np.random.RandomState) \
+            else random_state
+        n_samples = X.shape[0]
+        chunks = [(i, min(i + batch_size, n_samples))
+                  for i in range(0, n_samples, batch_size)]
+
+        def read_chunk(chunk):
+            Xc, sc = split_sensitive(X[chunk[0]:chunk[1]], ns,
+                                     self.fit_intercept)
+            return Xc, np.asarray(y[chunk[0]:chunk[1]], dtype=float), sc
+
+        # set instance variables, counting the sensitive values in one pass
+        counts = [np.bincount(read_chunk(chunk)[2]) for chunk in chunks]
+        self.n_s_ = ns
+        self.n_sfv_ = max(len(c) for c in counts)
+        self.c_s_ = np.zeros(self.n_sfv_)
+        for c in counts:
+            self.c_s_[:len(c)] += c
+        self.n_features_ = X.shape[1] - ns + (1 if self.fit_intercept else 0)
+        self.n_samples_ = n_samples
+
+        # initialization from the first chunk
+        self.init_coef(itype, *read_chunk(chunks[0]))
+        coef = self.coef_.reshape(self.n_sfv_, self.n_features_)
+
+        # decayed sums of the samples, sigma and d_sigma for each sensitive
+        # value, of which rho(s), pi and their derivatives are estimated
+        run_c = np.zeros(self.n_sfv_)
+        run_p = np.zeros(self.n_sfv_)
+        run_dp = np.zeros((self.n_sfv_, self.n_features_))
+        sum_g2 = np.zeros((self.n_sfv_, self.n_features_))
+
+        n_updates = 0
+        success = False
+        for epoch in range(n_epochs):
+            last_coef = coef.copy()
+            for i in rng.permutation(len(chunks)):
+                Xc, yc, sc = read_chunk(chunks[i])
+                S = sensitive_indicator(sc, self.n_sfv_)
+                p = sigmoid_rows(Xc, coef, sc)
+                dp = (p * (1.0 - p))[:, np.newaxis] * Xc
+
+                run_c = decay * run_c + np.dot(S, np.ones(len(sc)))
+                run_p = decay * run_p + np.dot(S, p)
+                run_dp = decay * run_dp + np.dot(S, dp)
+                c = np.maximum(run_c, EPSILON)
+                q = np.clip(run_p / c, EPSILON, 1.0 - EPSILON)
+                dq = run_dp / c[:, np.newaxis]
+                r = np.clip(np.sum(run_p) / np.sum(run_c),
+                            EPSILON, 1.0 - EPSILON)
+                dr = np.sum(run_dp, axis=0) / np.sum(run_c)
+
+                # gradient of the loss per sample
+                l, f = self.grad_loss_sums(Xc, yc, sc, S, p, dp, q, dq, r, dr)
+                grad = (-l + self.eta * f) / len(sc) \
+                    + self.C * coef / n_samples
+                sum_g2 += grad * grad
+                coef -= learning_rate * grad / (np.sqrt(sum_g2) + EPSILON)
+                n_updates += 1
+
+            if np.linalg.norm(coef - last_coef) < \
+               tol * max(1.0, np.linalg.norm(coef)):
+                success = True
+                break
+
+        # get final loss, whose regularizer only depends on the sums of sigma
+        # for each sensitive value
+        l = 0.0
+        sum_p = np.zeros(self.n_sfv_)
+        for chunk in chunks:
+            Xc, yc, sc = read_chunk(chunk)
+            p = sigmoid_rows(Xc, coef, sc)
+            l += np.sum(yc * np.log(p) + (1.0 - yc) * np.log(1.0 - p))
+            sum_p += np.bincount(sc, weights=p, minlength=self.n_sfv_)
+        q = sum_p / self.c_s_
+        r = np.sum(sum_p) / n_samples
+        f = np.sum(self.c_s_ * (q * (np.log(q) - np.log(r))
+                   + (1.0 - q) * (np.log(1.0 - q) - np.log(1.0 - r))))
+        self.f_loss_ = -l + self.eta * f + 0.5 * self.C * np.sum(coef * coef)
+
+        self.fit_stats_ = {'optimizer': 'sgd',
+                           'nit': n_updates,
+                           'nfev': 0,
+                           'njev': n_updates,
+                           'success': success,
+                           'seconds': time.time() - start}
+
+        return self
 
 class LRwPRObjetiveType4Mixin(LRwPR):
     """ objective function of logistic regression with prejudice remover
@@ -328,12 +657,10 @@ class LRwPRObjetiveType4Mixin(LRwPR):
         ### constants
 
         # sigma = Pr[y=0|x,s] = sigmoid(w(s)^T x)
-        p = np.array([sigmoid(X[i, :], coef[s[i], :])
-                      for i in range(self.n_samples_)])
+        p = sigmoid_rows(X, coef, s)
 
         # rho(s) = Pr[y=0|s] = \sum_{(xi,si)in D st si=s} sigma(xi,si) / #D[s]
-        q = np.array([np.sum(p[s == si])
-                      for si in range(self.n_sfv_)]) / self.c_s_
+        q = np.bincount(s, weights=p, minlength=self.n_sfv_) / self.c_s_
 
         # pi = Pr[y=0] = \sum_{(xi,si)in D} sigma(xi,si)
         r = np.sum(p) / self.n_samples_
@@ -387,28 +714,72 @@ class LRwPRObjetiveType4Mixin(LRwPR):
 
         # sigma = Pr[y=0|x,s] = sigmoid(w(s)^T x)
         # d_sigma(x,s) = d sigma / d w(s) = sigma (1 - sigma) x
-        p = np.array([sigmoid(X[i, :], coef[s[i], :])
-                      for i in range(self.n_samples_)])
+        p = sigmoid_rows(X, coef, s)
         dp = (p * (1.0 - p))[:, np.newaxis] * X
 
+        # sums over the samples with each sensitive value are products with
+        # this indicator matrix
+        S = sensitive_indicator(s, self.n_sfv_)
+
         # rho(s) = Pr[y=0|s] = \sum_{(xi,si)in D st si=s} sigma(xi,si) / #D[s]
         # d_rho(s) = \sum_{(xi,si)in D st si=s} d_sigma(xi,si) / #D[s]
-        q = np.array([np.sum(p[s == si])
-                      for si in range(self.n_sfv_)]) / self.c_s_
-        dq = np.array([np.sum(dp[s == si, :], axis=0)
-                       for si in range(self.n_sfv_)]) \
-                       / self.c_s_[:, np.newaxis]
+        q = np.bincount(s, weights=p, minlength=self.n_sfv_) / self.c_s_
+        dq = np.dot(S, dp) / self.c_s_[:, np.newaxis]
 
         # pi = Pr[y=0] = \sum_{(xi,si)in D} sigma(xi,si) / #D
         # d_pi = \sum_{(xi,si)in D} d_sigma(xi,si) / #D
         r = np.sum(p) / self.n_samples_
         dr = np.sum(dp, axis=0) / self.n_samples_
 
+        l[:, :], f = self.grad_loss_sums(X, y, s, S, p, dp, q, dq, r, dr)
+
+        # l2 regularizer
+        reg = coef
+
+        # sum
+        l[:, :] = -l + self.eta * f + self.C * reg
+#        print >> sys.stderr, "l =", l
+
+        return l_
+
+    def grad_loss_sums(self, X, y, s, S, p, dp, q, dq, r, dr):
+        """ sums of the derivatives of the likelihood and the fairness-aware
+        regularizer over the given samples
+
+        Parameters
+        ----------
+        X : array, shape=(n_samples, n_features)
+            feature vectors of samples
+        y : array, shape=(n_samples)
+            target class of samples
+        s : array, shape=(n_samples)
+            values of sensitive features
+        S : array, shape=(`n_sfv_`, n_samples)
+            indicator matrix of the values of sensitive features
+        p : array, shape=(n_samples)
+            sigma of the samples
+        dp : array, shape=(n_samples, n_features)
+            d_sigma of the samples
+        q : array, shape=(`n_sfv_`)
+            rho(s)
+        dq : array, shape=(`n_sfv_`, n_features)
+            d_rho(s)
+        r : float
+            pi
+        dr : array, shape=(n_features)
+            d_pi
+
+        Returns
+        -------
+        l : array, shape=(`n_sfv_`, n_features)
+            derivative of the likelihood by w(s)
+        f : array, shape=(`n_sfv_`, n_features)
+            derivative of the fairness-aware regularizer by w(s)
+        """
+
         # likelihood
         # l(si) = \sum_{x,y in D st s=si} (y - sigma(x, si)) x
-        for si in range(self.n_sfv_):
-            l[si, :] = np.sum((y - p)[s == si][:, np.newaxis] * X[s == si, :],
-                              axis=0)
+        l = np.dot(S, (y - p)[:, np.newaxis] * X)
 
         # fairness-aware regularizer
         # differentialy by w(s)
@@ -429,17 +800,9 @@ class LRwPRObjetiveType4Mixin(LRwPR):
         f4 = f1[:, np.newaxis] * dp \
             + f2[:, np.newaxis] * dq[s, :] \
             - np.outer(f3, dr)
-        f = np.array([np.sum(f4[s == si, :], axis=0)
-                      for si in range(self.n_sfv_)])
-
-        # l2 regularizer
-        reg = coef
+        f = np.dot(S, f4)
 
-        # sum
-        l[:, :] = -l + self.eta * f + self.C * reg
-#        print >> sys.stderr, "l =", l
-
-        return l_
+        return l, f
 
 class LRwPRType4\
     (LRwPRObjetiveType4Mixin,
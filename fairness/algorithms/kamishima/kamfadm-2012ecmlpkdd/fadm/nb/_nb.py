@@ -280,9 +280,7 @@ class GaussianNaiveBayes(BaseNaiveBayes):
         log_proba = np.repeat(\
             self._predict_class_log_proba_upto_const()[np.newaxis, :],
             X.shape[0], axis=0)
-        for i in range(X.shape[0]):
-            log_proba[i, :] += \
-                self._predict_Gaussian_log_proba_upto_const(X[i, :])
+        log_proba += self._predict_Gaussian_log_proba_upto_const(X)
 
         return log_proba
 
@@ -304,28 +302,29 @@ class GaussianNaiveBayes(BaseNaiveBayes):
         self.f_valid_[v] = np.all(self.x_var_[:, v], axis=0)
         self.is_valid_params_ = True
 
-    def _predict_Gaussian_log_proba_upto_const(self, x):
-        """ log probability of the given feature value
+    def _predict_Gaussian_log_proba_upto_const(self, X):
+        """ log probabilities of the given feature values
         
         Parameters
         ----------
-        x : array-like, shape=(n_gfeatures), dtype=float
-            feature vector
+        X : array-like, shape=(n_samples, n_gfeatures), dtype=float
+            array of feature values
 
         Returns
         -------
-        y_log_proba : array, shape=(n_classes), dtype=float
-            log probability of the given feature value
+        y_log_proba : array, shape=(n_samples, n_classes), dtype=float
+            log probabilities of the given feature values
         """
 
         log_normal_pdf = lambda x, m, v: \
             - np.log(v) / 2.0 - (x - m) ** 2 / (2.0 * v)
 
-        f = np.logical_and(self.f_valid_, np.isfinite(x))
-        log_proba = np.sum(log_normal_pdf(x[f],
-                                          self.x_mean_[:, f],
-                                          self.x_var_[:, f]),
-                           axis=1)
+        X = np.atleast_2d(X)[:, self.f_valid_]
+        log_pdf = log_normal_pdf(X[:, np.newaxis, :],
+                                 self.x_mean_[np.newaxis, :, self.f_valid_],
+                                 self.x_var_[np.newaxis, :, self.f_valid_])
+        log_pdf = np.where(np.isfinite(X)[:, np.newaxis, :], log_pdf, 0.0)
+        log_proba = np.sum(log_pdf, axis=2)
 
         return log_proba
 
@@ -413,11 +412,18 @@ class MultinomialNaiveBayes(BaseNaiveBayes):
             class
         """
 
+        # count all features at once, in one table whose columns are the
+        # values of all features, from the first to the last feature
+        n_values = np.sum(self.nfv)
+        offsets = np.cumsum(self.nfv) - self.nfv
+        valid = np.logical_and(X >= 0, X <= self.nfv)
+        values = np.minimum(np.floor(np.where(valid, X, 0)), self.nfv - 1)
+        index = y[:, np.newaxis] * n_values + offsets + values.astype(int)
+        counts = np.bincount(index[valid],
+                             minlength=self.n_classes * n_values).\
+                             reshape((self.n_classes, n_values))
         for fi in range(self.n_mfeatures):
-            self.pf_[fi] += np.histogram2d(y, X[:, fi],
-                                           bins=(self.n_classes, self.nfv[fi]),
-                                           range=((0, self.n_classes),
-                                                  (0, self.nfv[fi])))[0]
+            self.pf_[fi] += counts[:, offsets[fi]:offsets[fi] + self.nfv[fi]]
 
     def partial_fit(self, X, y):
         """ update model given one example
@@ -473,33 +479,34 @@ class MultinomialNaiveBayes(BaseNaiveBayes):
             self._predict_class_log_proba_upto_const()[np.newaxis, :],
             X.shape[0], axis=0)
 
-        for i in range(X.shape[0]):
-            log_proba[i, :] = \
-                self._predict_multinomial_log_proba_upto_const(X[i, :])
+        log_proba[:, :] = self._predict_multinomial_log_proba_upto_const(X)
 
         return log_proba
 
-    def _predict_multinomial_log_proba_upto_const(self, x):
-        """ log probability of the given feature value
+    def _predict_multinomial_log_proba_upto_const(self, X):
+        """ log probabilities of the given feature values
         
         Parameters
         ----------
-        x : array-like, shape=(n_mfeatures), dtype=float
-            feature vector
+        X : array-like, shape=(n_samples, n_mfeatures), dtype=float
+            array of feature values
 
         Returns
         -------
-        y_log_proba : array, shape=(n_classes), dtype=float
-            log probability of the given feature value
+        y_log_proba : array, shape=(n_samples, n_classes), dtype=float
+            log probabilities of the given feature values
         """
 
-        f = np.arange(self.n_mfeatures, dtype=int)[np.isfinite(x)]
-        if len(f) == 0:
-            return np.zeros(self.n_classes)
+        X = np.atleast_2d(X)
 
-        p = lambda i: np.log(self.pf_[i][:, int(x[i])]) \
-            - np.log(np.sum(self.pf_[i], axis=1))
-        log_proba = np.sum([p(i) for i in f], axis=0)
+        # the log probabilities of all values of each feature are gathered
+        # for all samples, and missing values are skipped
+        log_proba = np.zeros((X.shape[0], self.n_classes))
+        for i in range(self.n_mfeatures):
+            f = np.isfinite(X[:, i])
+            log_pf = np.log(self.pf_[i]) \
+                - np.log(np.sum(self.pf_[i], axis=1))[:, np.newaxis]
+            log_proba[f, :] += log_pf[:, X[f, i].astype(int)].T
 
         return log_proba
 
@@ -626,15 +633,13 @@ class CompositeNaiveBayes(MultinomialNaiveBayes, GaussianNaiveBayes):
         if self.n_gfeatures > 0:
             if not self.is_valid_params_:
                 self._update_mean_var()
-            for i in range(X.shape[0]):
-                log_proba[i, :] += \
-                    self._predict_Gaussian_log_proba_upto_const(X[i, self.gfeatures])
+            log_proba += \
+                self._predict_Gaussian_log_proba_upto_const(X[:, self.gfeatures])
 
         # multinomial probabiliteis
         if self.n_mfeatures > 0:
-            for i in range(X.shape[0]):
-                log_proba[i, :] += \
-                    self._predict_multinomial_log_proba_upto_const(X[i, self.mfeatures])
+            log_proba += \
+                self._predict_multinomial_log_proba_upto_const(X[:, self.mfeatures])
 
         return log_proba
 
@@ -39,6 +39,8 @@ __all__ = ['CaldersVerwerTwoNaiveBayes']
 # Constants
 #==============================================================================
 
+BISECTION_TOL = 1e-6
+
 #==============================================================================
 # Module variables
 #==============================================================================
@@ -103,7 +105,7 @@ class CaldersVerwerTwoNaiveBayes(BaseEstimator,
                                                self.alpha,
                                                self.beta)
 
-    def fit(self, X, y, ns=1, delta=0.01):
+    def fit(self, X, y, ns=1, delta=0.01, search='step'):
         """ train this model
 
         Parameters
@@ -116,6 +118,11 @@ class CaldersVerwerTwoNaiveBayes(BaseEstimator,
             the number of sensitive variables
         delta : float
             parameters to modify joint histogram of y and s
+        search : str, default='step'
+            how to modify joint histogram of y and s: 'step' moves counts
+            between classes by steps of delta until the discrimination is
+            removed, 'bisect' searches the amounts of counts to move by
+            bisection instead
         """
 
         X = np.array(X)
@@ -132,8 +139,34 @@ class CaldersVerwerTwoNaiveBayes(BaseEstimator,
         for i in range(self.N_S_VALUES):
             self.clr_[i].fit(XX[s == i, :], y[s == i])
 
+        # log-likelihoods of classes, which do not depend on pys_ and are
+        # computed only once
+        log_like = self._predict_log_likelihood(X)
+
         # modify joint statistics of y and s
-        numpos, disc = self._get_stats(X, y)
+        if search == 'step':
+            self._modify_joint_by_steps(log_like, s, d_numpos, delta)
+        elif search == 'bisect':
+            self._modify_joint_by_bisection(log_like, s, d_numpos)
+        else:
+            raise ValueError("unknown search: " + str(search))
+
+    def _modify_joint_by_steps(self, log_like, s, d_numpos, delta):
+        """ modify joint histogram of y and s by steps of delta
+
+        Parameters
+        ----------
+        log_like : array, shape=(n_samples, n_classes)
+            log-likelihoods of classes of samples
+        s : array, shape=(n_samples)
+            sensitive values of samples
+        d_numpos : int
+            the number of positive samples in training data
+        delta : float
+            parameters to modify joint histogram of y and s
+        """
+
+        numpos, disc = self._get_stats(log_like, s)
 #        print >> sys.stderr, "numpos, disc =", numpos, disc
 #        print >> sys.stderr, "pys_ =", self.pys_[0, :], self.pys_[1, :]
         pos_flag = True
@@ -152,32 +185,92 @@ class CaldersVerwerTwoNaiveBayes(BaseEstimator,
                     self.pys_[0, 1] -= delta * self.pys_[1, 0]
                     self.pys_[1, 1] += delta * self.pys_[1, 0]
                     pos_flag = False
-            numpos, disc = self._get_stats(X, y)
+            numpos, disc = self._get_stats(log_like, s)
 #            print >> sys.stderr, "numpos, disc =", numpos, disc
 #            print >> sys.stderr, "pys_ =", self.pys_[0, :], self.pys_[1, :]
 
-    def _get_stats(self, X, y):
+    def _modify_joint_by_bisection(self, log_like, s, d_numpos,
+                                   tol=BISECTION_TOL):
+        """ modify joint histogram of y and s by bisection
+
+        The counts moved from negative to positive class for s=0 are searched
+        so that the number of predicted positives is not less than d_numpos,
+        and the counts moved from positive to negative class for s=1 are
+        searched so that the discrimination is removed.
+
+        Parameters
+        ----------
+        log_like : array, shape=(n_samples, n_classes)
+            log-likelihoods of classes of samples
+        s : array, shape=(n_samples)
+            sensitive values of samples
+        d_numpos : int
+            the number of positive samples in training data
+        tol : float
+            precision of the searched counts relative to the number of
+            samples
+        """
+
+        if not self._get_stats(log_like, s)[1] > 0.0:
+            return
+
+        pys = self.pys_.copy()
+        eps = tol * self.n_samples
+        move = lambda u, t: pys + np.array([[-u, t], [u, -t]])
+
+        def search_u(t):
+            # the smallest amount moved for s=0 that keeps positives
+            numpos_at = lambda u: self._get_stats(log_like, s, move(u, t))[0]
+            lo, hi = 0.0, pys[0, 0]
+            if numpos_at(hi) >= d_numpos:
+                while hi - lo > eps:
+                    mid = (lo + hi) / 2.0
+                    if numpos_at(mid) < d_numpos:
+                        lo = mid
+                    else:
+                        hi = mid
+            return hi
+
+        # the smallest amount moved for s=1 that removes the discrimination
+        disc_at = lambda t: self._get_stats(log_like, s,
+                                            move(search_u(t), t))[1]
+        lo, hi = 0.0, pys[1, 1]
+        if not disc_at(hi) > 0.0:
+            while hi - lo > eps:
+                mid = (lo + hi) / 2.0
+                if disc_at(mid) > 0.0:
+                    lo = mid
+                else:
+                    hi = mid
+        self.pys_ = move(search_u(hi), hi)
+
+    def _get_stats(self, log_like, s, pys=None):
         """ get statistics
 
         Parameters
         ----------
-        X : array, shape=(n_samples, n_features)
-            feature vectors of samples
-        y : array, shape=(n_samples)
-            target class of samples
+        log_like : array, shape=(n_samples, n_classes)
+            log-likelihoods of classes of samples
+        s : array, shape=(n_samples)
+            sensitive values of samples
+        pys : array, shape=(n_classes, n_sensitive_values), optional
+            joint counts for classes and sensitive features, `pys_` if None
         """
 
-        py = self.predict(X)
-        s = X[:, -self.ns]
-        m = np.histogram2d(py, s, [2, 2], [[0, 2], [0, 2]])[0]
+        if pys is None:
+            pys = self.pys_
+        py = np.argmax(log_like +
+                       np.log(pys + self.alpha / self.N_CLASSES)[:, s].T,
+                       axis=1)
+        m = np.bincount(py * 2 + s, minlength=4).reshape((2, 2))
 
         numpos = np.sum(m[1, :])
         disc = m[1, 1] / np.sum(m[:, 1]) - m[1, 0] / np.sum(m[:, 0])
 
         return numpos, disc
 
-    def _predict_log_proba_upto_const(self, X):
-        """ log probabilities up to constant term
+    def _predict_log_likelihood(self, X):
+        """ log-likelihoods of classes, excluding the joint prior of y and s
 
         Parameters
         ----------
@@ -186,22 +279,39 @@ class CaldersVerwerTwoNaiveBayes(BaseEstimator,
 
         Returns
         -------
-        y_log_proba : array-like, shape=(n_classes, n_features), dtype=float
-            log probabilities up to constant term
+        log_like : array-like, shape=(n_samples, n_classes), dtype=float
+            log-likelihoods up to constant term
         """
 
         s = np.atleast_1d(X[:, -self.ns].astype(int))
         XX = np.atleast_2d(X[:, :-self.ns])
 
-        log_proba = np.empty((X.shape[0], self.N_CLASSES))
+        log_like = np.empty((X.shape[0], self.N_CLASSES))
         for si in np.unique(s):
-            log_proba[s == si, :] = \
+            log_like[s == si, :] = \
                 self.clr_[si]._predict_composite_log_proba_upto_const(
-                    XX[s == si, :]) + \
-                np.log(self.pys_[:, si] +
-                       self.alpha / self.N_CLASSES)[np.newaxis, :]
+                    XX[s == si, :])
+
+        return log_like
+
+    def _predict_log_proba_upto_const(self, X):
+        """ log probabilities up to constant term
+
+        Parameters
+        ----------
+        X : array-like, shape=(n_samples, n_features)
+            array of feature values
+
+        Returns
+        -------
+        y_log_proba : array-like, shape=(n_classes, n_features), dtype=float
+            log probabilities up to constant term
+        """
+
+        s = np.atleast_1d(X[:, -self.ns].astype(int))
 
-        return log_proba
+        return self._predict_log_likelihood(X) + \
+            np.log(self.pys_ + self.alpha / self.N_CLASSES)[:, s].T
 
 #==============================================================================
 # Functions
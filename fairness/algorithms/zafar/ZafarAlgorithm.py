@@ -1,13 +1,18 @@
 from fairness.algorithms.Algorithm import Algorithm
+from fairness.algorithms.zafar import load_fair_classification
 import numpy
-import tempfile
-import os
-import subprocess
-import json
-import sys
-import numpy
+
+ut, lf = load_fair_classification()
 
 class ZafarAlgorithmBase(Algorithm):
+    """
+    Notes:
+
+    - The classifier of fair_classification/utils.py is trained and evaluated in this process, in
+    the same way as the original run-classifier/main.py script does it, but on in-memory arrays
+    instead of JSON files.  Each subclass gives the mode of main.py that it runs in.
+
+    """
 
     def __init__(self):
         Algorithm.__init__(self)
@@ -24,48 +29,58 @@ class ZafarAlgorithmBase(Algorithm):
         else:
             class_type = type(value_0.item()) # this should be numpy.int64 or numpy.int32,
 
-        def create_file(df):
-            out = {}
-            out["x"] = df.drop(columns=[class_attr]).as_matrix().tolist()
-            out["class"] = (2 * df[class_attr] - 1).as_matrix().tolist()
-            out["sensitive"] = {}
-            out["sensitive"][single_sensitive] = df[single_sensitive].as_matrix().tolist()
-            fd, name = tempfile.mkstemp()
-            os.close(fd)
-            out_file = open(name, "w")
-            json.dump(out, out_file)
-            out_file.close()
-            return name
-
-        train_name = create_file(train_df)
-        test_name = create_file(test_df)
-        fd, predictions_name = tempfile.mkstemp()
-        os.close(fd)
-        # print("CURRENT DIR: %s" % os.getcwd())
-        # print("SENSITIVE ATTR: %s" % single_sensitive)
-
-        cmd = self.create_command_line(train_name, test_name, predictions_name, params)
-        BASE_DIR = os.path.dirname(__file__)
-        result = subprocess.run(cmd,
-            cwd = BASE_DIR + '/fair-classification-master/disparate_impact/run-classifier/')
-        os.unlink(train_name)
-        os.unlink(test_name)
-        if result.returncode != 0:
-            os.unlink(predictions_name)
-            raise Exception("Algorithm did not execute succesfully")
-        else:
-            predictions = open(predictions_name).read()
-            predictions = json.loads(predictions)
-            os.unlink(predictions_name)
-            # m = numpy.loadtxt(output_name)
-            # os.unlink(output_name)
-
-            # predictions = m[:,1]
-            predictions_correct = [0 if class_type(x) == -1 else 1 for x in predictions]
-
-            # print("Predictions:  %s" % predictions_correct)
-            # print("ground truth: %s" % test_df[class_attr].as_matrix().tolist())
-            return predictions_correct, []
+        # as main.py does: all attributes but the class (including the sensitive ones) are
+        # features, after an intercept, and the classes are -1 and 1.  The matrices are row-major
+        # like the ones that main.py loads, since the optimizer's results depend on it.
+        def create_matrix(df):
+            return numpy.ascontiguousarray(ut.add_intercept(df.drop(columns=[class_attr]).values))
+
+        x_train = create_matrix(train_df)
+        y_train = (2 * train_df[class_attr] - 1).values
+        x_control_train = { single_sensitive : train_df[single_sensitive].values }
+        x_test = create_matrix(test_df)
+
+        mode, cov_thresh = self.get_train_mode(params)
+        thresh = {}
+        if cov_thresh is not None:
+            thresh = { single_sensitive : cov_thresh }
+
+        w = train_classifier(x_train, y_train, x_control_train, [single_sensitive], mode, thresh)
+
+        # as main.py does: the sign of the distance to the decision boundary is the class
+        predictions = numpy.sign(numpy.dot(x_test, w)).tolist()
+        predictions_correct = [0 if class_type(x) == -1 else 1 for x in predictions]
+
+        return predictions_correct, []
+
+    def get_train_mode(self, params):
+        """
+        Returns (mode, cov_thresh): the mode of main.py's train_classifier() for the given
+        parameters, and the covariance threshold of its fairness constraint (None if the mode has
+        no such constraint).
+        """
+        raise NotImplementedError("get_train_mode() in ZafarAlgorithmBase is not implemented")
+
+def train_classifier(x, y, x_control, sensitive_attrs, mode, sensitive_attrs_to_cov_thresh):
+    """
+    Returns the weights of the classifier trained as main.py's train_classifier() does.  The
+    initial weights are drawn right after seeding numpy's random generator as utils.py does when
+    main.py imports it, so that each run starts from the same weights; the state of the generator
+    is restored afterwards.
+    """
+    state = numpy.random.get_state()
+    numpy.random.seed(ut.SEED)
+    try:
+        return ut.train_model(
+            x, y, x_control, lf._logistic_loss,
+            mode.get('fairness', 0),
+            mode.get('accuracy', 0),
+            mode.get('separation', 0),
+            sensitive_attrs,
+            sensitive_attrs_to_cov_thresh,
+            mode.get('gamma', None))
+    finally:
+        numpy.random.set_state(state)
 
 ##############################################################################
 
@@ -75,12 +90,8 @@ class ZafarAlgorithmBaseline(ZafarAlgorithmBase):
         ZafarAlgorithmBase.__init__(self)
         self.name = "ZafarBaseline"
 
-    def create_command_line(self, train_name, test_name, predictions_name, params):
-        return ['python3', 'main.py',
-                train_name,
-                test_name,
-                predictions_name,
-                'baseline', '0']
+    def get_train_mode(self, params):
+        return {}, None
 
 class ZafarAlgorithmAccuracy(ZafarAlgorithmBase):
 
@@ -95,13 +106,8 @@ class ZafarAlgorithmAccuracy(ZafarAlgorithmBase):
     def get_default_params(self):
         return {'gamma': 0.5}
 
-    def create_command_line(self, train_name, test_name, predictions_name, params):
-        return ['python3', 'main.py',
-                train_name,
-                test_name,
-                predictions_name,
-                'gamma',
-                str(params['gamma'])]
+    def get_train_mode(self, params):
+        return { 'accuracy' : 1, 'gamma' : float(params['gamma']) }, None
 
 class ZafarAlgorithmFairness(ZafarAlgorithmBase):
 
@@ -116,11 +122,6 @@ class ZafarAlgorithmFairness(ZafarAlgorithmBase):
     def get_default_params(self):
         return {'c': 0.001}
 
-    def create_command_line(self, train_name, test_name, predictions_name, params):
-        return ['python3', 'main.py',
-                train_name,
-                test_name,
-                predictions_name,
-                'c',
-                str(params['c'])]
+    def get_train_mode(self, params):
+        return { 'fairness' : 1 }, float(params['c'])
 
@@ -0,0 +1,52 @@
+import importlib.util
+import os
+import random
+import sys
+
+import numpy
+
+# The algorithms in this package call the fair_classification code of Zafar et al. directly, as
+# run-classifier/main.py does.  Its directory is not a package and its modules have generic names
+# (utils, loss_funcs), so they are loaded under private names instead of being put on the path.
+FAIR_CLASSIFICATION_DIR = os.path.join(os.path.dirname(__file__), 'fair-classification-master',
+                                       'fair_classification')
+
+def load_fair_classification_module(name):
+    """
+    Loads the given module of fair_classification as fairness.algorithms.zafar._<name>.
+    """
+    private_name = '%s._%s' % (__name__, name)
+    if private_name in sys.modules:
+        return sys.modules[private_name]
+    path = os.path.join(FAIR_CLASSIFICATION_DIR, name + '.py')
+    spec = importlib.util.spec_from_file_location(private_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[private_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except:
+        del sys.modules[private_name]
+        raise
+    return module
+
+def load_fair_classification():
+    """
+    Returns the utils and loss_funcs modules of fair_classification.  Importing utils seeds the
+    global random and numpy generators, so their states are restored afterwards.
+    """
+    random_state = random.getstate()
+    numpy_state = numpy.random.get_state()
+    # utils does "import loss_funcs as lf", which has to find the privately loaded module
+    old_loss_funcs = sys.modules.get('loss_funcs')
+    try:
+        loss_funcs = load_fair_classification_module('loss_funcs')
+        sys.modules['loss_funcs'] = loss_funcs
+        utils = load_fair_classification_module('utils')
+    finally:
+        if old_loss_funcs is None:
+            sys.modules.pop('loss_funcs', None)
+        else:
+            sys.modules['loss_funcs'] = old_loss_funcs
+        random.setstate(random_state)
+        numpy.random.set_state(numpy_state)
+    return utils, loss_funcs
@@ -6,13 +6,21 @@ import subprocess
 
 from ggplot import *
 
+from fairness import results_db
+from fairness import results_parquet
 from fairness.data.objects.list import DATASETS, get_dataset_names
 from fairness.data.objects.ProcessedData import TAGS
 
 # The graphs to generate: (xaxis measure, yaxis measure)
 GRAPHS = [('DIbinary', 'accuracy'), ('sex-TPR', 'sex-calibration-')]
 
-def run(dataset = get_dataset_names(), graphs = GRAPHS):
+# The readers of the results stores other than the CSV files (see benchmark.run)
+STORE_READERS = {
+    'sqlite' : results_db.get_results_data_frame,
+    'parquet' : results_parquet.get_results_data_frame
+}
+
+def run(dataset = get_dataset_names(), graphs = GRAPHS, store = 'csv'):
     for dataset_obj in DATASETS:
         if not dataset_obj.get_dataset_name() in dataset:
             continue
@@ -21,6 +29,10 @@ def run(dataset = get_dataset_names(), graphs = GRAPHS):
         for sensitive in dataset_obj.get_sensitive_attributes_with_joint():
             for tag in TAGS:
                 print("    type:" + tag)
+                if store in STORE_READERS:
+                    make_store_graphs(STORE_READERS[store], dataset_obj.get_dataset_name(),
+                                      sensitive, tag, graphs)
+                    continue
                 filename = dataset_obj.get_results_filename(sensitive, tag)
                 make_all_graphs(filename, graphs)
     print("Generating additional figures in R...")
@@ -35,12 +47,28 @@ def make_all_graphs(filename, graphs):
        return
     else:
         o = pathlib.Path(filename).parts[-1].split('.')[0]
- 
-        if graphs == 'all':
-            graphs = all_possible_graphs(f)
- 
-        for xaxis, yaxis in graphs:
-            generate_graph(f, xaxis, yaxis, o)
+        make_graphs(f, graphs, o)
+
+def make_store_graphs(reader, dataset_name, sensitive, tag, graphs):
+    """
+    Like make_all_graphs(), but reads the results with the given results store reader, and only
+    the columns of the measures that are graphed.
+    """
+    metrics = None
+    if graphs != 'all':
+        metrics = sorted(set(measure for graph in graphs for measure in graph))
+    f = reader(dataset_name, sensitive, tag, metrics)
+    if len(f) == 0:
+        print("No results for:" + dataset_name + "_" + sensitive + "_" + tag)
+        return
+    make_graphs(f, graphs, dataset_name + "_" + sensitive + "_" + tag)
+
+def make_graphs(f, graphs, title):
+    if graphs == 'all':
+        graphs = all_possible_graphs(f)
+
+    for xaxis, yaxis in graphs:
+        generate_graph(f, xaxis, yaxis, title)
 
 def all_possible_graphs(f):
     graphs = []
@@ -1,17 +1,30 @@
 import fire
+import multiprocessing
+import numpy
 import os
+import random
 import statistics
 import sys
+import zlib
 
 from fairness import results
+from fairness import results_db
+from fairness import results_parquet
 from fairness.data.objects.list import DATASETS, get_dataset_names
 from fairness.data.objects.ProcessedData import ProcessedData
+from fairness.algorithms.Algorithm import FIT_STATS
 from fairness.algorithms.list import ALGORITHMS
 from fairness.metrics.list import get_metrics
+from fairness.metrics.ConfusionCounts import calc_metrics, stack_predictions
+from fairness.metrics.SensitiveGroups import get_sensitive_groups
 
 from fairness.algorithms.ParamGridSearch import ParamGridSearch
 
 NUM_TRIALS_DEFAULT = 10
+NUM_WORKERS_DEFAULT = 1
+SEED_DEFAULT = 0
+STORE_DEFAULT = 'csv'
+STORES = ['csv', 'sqlite', 'parquet']
 
 def get_algorithm_names():
     result = [algorithm.get_name() for algorithm in ALGORITHMS]
@@ -21,8 +34,36 @@ def get_algorithm_names():
     return result
 
 def run(num_trials = NUM_TRIALS_DEFAULT, dataset = get_dataset_names(),
-        algorithm = get_algorithm_names()):
+        algorithm = get_algorithm_names(), workers = NUM_WORKERS_DEFAULT, seed = SEED_DEFAULT,
+        resume = False, sync_rows = results.SYNC_ROWS_DEFAULT,
+        sync_seconds = results.SYNC_SECONDS_DEFAULT, store = STORE_DEFAULT):
+    """
+    Runs the selected algorithms on the selected datasets and writes the metric results to the
+    results files.  If workers is greater than one, each (sensitive attribute, algorithm, trial,
+    tag) combination is run in a pool of that many processes; results are still written by this
+    process, in the same order as a serial run.
+
+    The train/test splits are drawn from the given seed, and the global random generators are
+    reseeded from it before each work unit (see get_work_unit_seed()), so that algorithms that
+    draw from them give the same results with any number of workers.  If resume is True, work
+    units that already have results (from an earlier, possibly interrupted, run with the same
+    seed) are skipped.
+
+    Results are synced to disk once sync_rows rows or sync_seconds seconds have gone by since the
+    last sync (see results.SyncPolicy); with both set to None, only when each file is closed.
+
+    With store='sqlite', results are upserted into the results database (see results_db) instead
+    of being written to the CSV results files, and with store='parquet', they are appended to the
+    columnar results store (see results_parquet).  The statistics of the model fits of algorithms
+    that report them (see Algorithm.get_fit_stats()) are written along with the results.
+    """
+    if store not in STORES:
+        raise ValueError("Unknown results store '%s', expected one of %s" % (store, STORES))
+    if store == 'parquet':
+        results_parquet.check_pyarrow()
     algorithms_to_run = algorithm
+    sync_policy = create_sync_policy(sync_rows, sync_seconds)
+    tags_to_load = get_supported_data_types(algorithms_to_run)
 
     print("Datasets: '%s'" % dataset)
     for dataset_obj in DATASETS:
@@ -31,107 +72,240 @@ def run(num_trials = NUM_TRIALS_DEFAULT, dataset = get_dataset_names(),
 
         print("\nEvaluating dataset:" + dataset_obj.get_dataset_name())
 
-        processed_dataset = ProcessedData(dataset_obj)
-        train_test_splits = processed_dataset.create_train_test_splits(num_trials)
-
-        all_sensitive_attributes = dataset_obj.get_sensitive_attributes_with_joint()
-        for sensitive in all_sensitive_attributes:
-
-            print("Sensitive attribute:" + sensitive)
-
-            detailed_files = dict((k, create_detailed_file(
-                                          dataset_obj.get_results_filename(sensitive, k),
-                                          dataset_obj,
-                                          processed_dataset.get_sensitive_values(k), k))
-                for k in train_test_splits.keys())
-
-            for algorithm in ALGORITHMS:
-                if not algorithm.get_name() in algorithms_to_run:
-                    continue
-
-                print("    Algorithm: %s" % algorithm.get_name())
-                print("       supported types: %s" % algorithm.get_supported_data_types())
-                if algorithm.__class__ is ParamGridSearch:
-                    param_files =  \
-                        dict((k, create_detailed_file(
-                                     dataset_obj.get_param_results_filename(sensitive, k,
-                                                                            algorithm.get_name()),
-                                     dataset_obj, processed_dataset.get_sensitive_values(k), k))
-                          for k in train_test_splits.keys())
-                for i in range(0, num_trials):
-                    for supported_tag in algorithm.get_supported_data_types():
-                        train, test = train_test_splits[supported_tag][i]
-                        try:
-                            params, results, param_results =  \
-                                run_eval_alg(algorithm, train, test, dataset_obj, processed_dataset,
-                                             all_sensitive_attributes, sensitive, supported_tag)
-                        except Exception as e:
-                            import traceback
-                            traceback.print_exc(file=sys.stderr)
-                            print("Failed: %s" % e, file=sys.stderr)
-                        else:
-                            write_alg_results(detailed_files[supported_tag],
-                                              algorithm.get_name(), params, i, results)
-                            if algorithm.__class__ is ParamGridSearch:
-                                for params, results in param_results:
-                                    write_alg_results(param_files[supported_tag],
-                                                      algorithm.get_name(), params, i, results)
-
-            print("Results written to:")
+        processed_dataset = ProcessedData(dataset_obj, tags_to_load)
+        train_test_splits = processed_dataset.create_train_test_splits(num_trials, seed)
+
+        pool = None
+        if workers > 1:
+            # the workers share the dataframes read before they are forked
+            processed_dataset.load_dataframes()
+            pool = multiprocessing.Pool(workers, initializer=init_worker,
+                                        initargs=(processed_dataset, num_trials, seed))
+        try:
+            all_sensitive_attributes = dataset_obj.get_sensitive_attributes_with_joint()
+            for sensitive in all_sensitive_attributes:
+
+                print("Sensitive attribute:" + sensitive)
+
+                detailed_files = dict((k, create_results_writer(
+                                              store, dataset_obj, processed_dataset, sensitive, k,
+                                              resume, sync_policy))
+                    for k in train_test_splits.keys())
+                param_files = {}
+                fit_stats_files = {}
+
+                units = get_work_units(algorithms_to_run, sensitive, num_trials)
+                if resume:
+                    num_units = len(units)
+                    units = [unit for unit in units if not is_finished(
+                        unit, detailed_files, param_files, dataset_obj, processed_dataset,
+                        sync_policy, store)]
+                    print("Resuming: skipping %d finished work units" % (num_units - len(units)))
+                if pool is None:
+                    outcomes = (run_work_unit(processed_dataset, num_trials, seed, unit)
+                                for unit in units)
+                else:
+                    outcomes = pool.imap(run_worker_unit, units)
+
+                last_algorithm = None
+                for (algorithm, _, i, supported_tag), outcome in zip(units, outcomes):
+                    if algorithm is not last_algorithm:
+                        print("    Algorithm: %s" % algorithm.get_name())
+                        print("       supported types: %s" % algorithm.get_supported_data_types())
+                        last_algorithm = algorithm
+                    if outcome is None:
+                        continue
+
+                    # The row in the results file is written last, so that a unit with a row
+                    # there also has all of its param results and fit stats rows.
+                    params, results, param_results, fit_stats = outcome
+                    if len(fit_stats) > 0:
+                        fit_stats_file = get_fit_stats_file(fit_stats_files, dataset_obj,
+                                                            processed_dataset, sensitive,
+                                                            supported_tag, resume, sync_policy,
+                                                            store)
+                        for fit_params, stats in fit_stats:
+                            write_alg_results(fit_stats_file, algorithm.get_name(), fit_params, i,
+                                              [stats[name] for name in FIT_STATS])
+                    if algorithm.__class__ is ParamGridSearch:
+                        param_file = get_param_file(param_files, algorithm, dataset_obj,
+                                                    processed_dataset, sensitive, supported_tag,
+                                                    resume, sync_policy, store)
+                        for grid_params, grid_results in param_results:
+                            write_alg_results(param_file, algorithm.get_name(), grid_params, i,
+                                              grid_results)
+                    write_alg_results(detailed_files[supported_tag],
+                                      algorithm.get_name(), params, i, results)
+
+                print("Results written to:")
+                for detailed_file in detailed_files.values():
+                    print("    %s" % detailed_file.filename)
+
+                for detailed_file in detailed_files.values():
+                    detailed_file.close()
+                for param_file in param_files.values():
+                    param_file.close()
+                for fit_stats_file in fit_stats_files.values():
+                    fit_stats_file.close()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+def get_supported_data_types(algorithms_to_run):
+    """
+    Returns the set of tags supported by any of the algorithms to run, i.e., the processed
+    versions of the data that the run needs.
+    """
+    tags = set()
+    for algorithm in ALGORITHMS:
+        if algorithm.get_name() in algorithms_to_run:
+            tags |= algorithm.get_supported_data_types()
+    return tags
+
+def get_work_units(algorithms_to_run, sensitive, num_trials):
+    """
+    Returns the list of (algorithm, sensitive, trial, tag) work units for one sensitive attribute
+    in the order that a serial run visits them.  Each unit can be run independently of the others.
+    """
+    units = []
+    for algorithm in ALGORITHMS:
+        if not algorithm.get_name() in algorithms_to_run:
+            continue
+        for i in range(0, num_trials):
             for supported_tag in algorithm.get_supported_data_types():
-                print("    %s" % dataset_obj.get_results_filename(sensitive, supported_tag))
+                units.append((algorithm, sensitive, i, supported_tag))
+    return units
 
-            for detailed_file in detailed_files.values():
-                detailed_file.close()
+def get_work_unit_seed(seed, dataset_obj, unit):
+    """
+    Returns the seed of the global random generators for the given work unit, derived from the
+    seed of the run and the unit alone, so that it does not depend on the process that runs the
+    unit or on the units it ran before.
+    """
+    algorithm, sensitive, i, supported_tag = unit
+    key = "%s,%s,%s,%s,%d,%s" % (seed, dataset_obj.get_dataset_name(), sensitive,
+                                 algorithm.get_name(), i, supported_tag)
+    return zlib.crc32(key.encode('utf-8'))
+
+def run_work_unit(processed_dataset, num_trials, seed, unit):
+    """
+    Runs a single (algorithm, sensitive, trial, tag) work unit and returns the (params, results,
+    param_results, fit_stats) from run_eval_alg, or None if the algorithm failed.  If seed is
+    given, the global random generators are reseeded for the unit first.
+    """
+    algorithm, sensitive, i, supported_tag = unit
+    dataset_obj = processed_dataset.data
+    if seed is not None:
+        unit_seed = get_work_unit_seed(seed, dataset_obj, unit)
+        random.seed(unit_seed)
+        numpy.random.seed(unit_seed)
+    all_sensitive_attributes = dataset_obj.get_sensitive_attributes_with_joint()
+    split = processed_dataset.create_train_test_splits(num_trials)[supported_tag][i]
+    train, test = split
+    sensitive_groups = split.get_sensitive_groups(all_sensitive_attributes)
+    try:
+        return run_eval_alg(algorithm, train, test, dataset_obj, processed_dataset,
+                            all_sensitive_attributes, sensitive, supported_tag, sensitive_groups)
+    except Exception as e:
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+        print("Failed: %s" % e, file=sys.stderr)
+        return None
+
+# State of a pool worker process, set once by init_worker so that the processed data and its
+# splits are not sent along with every work unit.
+_worker_dataset = None
+_worker_num_trials = None
+_worker_seed = None
+
+def init_worker(processed_dataset, num_trials, seed):
+    global _worker_dataset, _worker_num_trials, _worker_seed
+    _worker_dataset = processed_dataset
+    _worker_num_trials = num_trials
+    _worker_seed = seed
+
+def run_worker_unit(unit):
+    return run_work_unit(_worker_dataset, _worker_num_trials, _worker_seed, unit)
+
+def get_param_file(param_files, algorithm, dataset_obj, processed_dataset, sensitive, tag,
+                   resume, sync_policy=None, store=STORE_DEFAULT):
+    key = (algorithm.get_name(), tag)
+    if not key in param_files:
+        param_files[key] = create_results_writer(store, dataset_obj, processed_dataset, sensitive,
+                                                 tag, resume, sync_policy, algorithm.get_name())
+    return param_files[key]
+
+def get_fit_stats_file(fit_stats_files, dataset_obj, processed_dataset, sensitive, tag, resume,
+                       sync_policy=None, store=STORE_DEFAULT):
+    if not tag in fit_stats_files:
+        fit_stats_files[tag] = create_fit_stats_writer(store, dataset_obj, processed_dataset,
+                                                       sensitive, tag, resume, sync_policy)
+    return fit_stats_files[tag]
+
+def is_finished(unit, detailed_files, param_files, dataset_obj, processed_dataset,
+                sync_policy=None, store=STORE_DEFAULT):
+    """
+    Returns True if the results of the given work unit have already been written, i.e., its
+    (algorithm, run-id) has a row in the results file and, for a ParamGridSearch, in the param
+    results file.
+    """
+    algorithm, sensitive, i, supported_tag = unit
+    if not detailed_files[supported_tag].has_result(algorithm.get_name(), i):
+        return False
+    if algorithm.__class__ is ParamGridSearch:
+        param_file = get_param_file(param_files, algorithm, dataset_obj, processed_dataset,
+                                    sensitive, supported_tag, True, sync_policy, store)
+        return param_file.has_result(algorithm.get_name(), i)
+    return True
 
 def write_alg_results(file_handle, alg_name, params, run_id, results_list):
-    line = alg_name + ','
-    params = ";".join("%s=%s" % (k, v) for (k, v) in params.items())
-    line += params + (',%s,' % run_id)
-    line += ','.join(str(x) for x in results_list) + '\n'
-    file_handle.write(line)
+    file_handle.write_results(alg_name, params, run_id, results_list)
 
 def run_eval_alg(algorithm, train, test, dataset, processed_data, all_sensitive_attributes,
-                 single_sensitive, tag):
+                 single_sensitive, tag, sensitive_groups=None):
     """
-    Runs the algorithm and gets the resulting metric evaluations.
+    Runs the algorithm and gets the resulting metric evaluations, along with the statistics of its
+    model fits.  The sensitive_groups of the test set can be passed in when they are shared
+    between runs on the same split; otherwise they are computed here.
     """
     privileged_vals = dataset.get_privileged_class_names_with_joint(tag)
     positive_val = dataset.get_positive_class_val(tag)
 
-    # get the actual classifications and sensitive attributes
+    # get the actual classifications
     actual = test[dataset.get_class_attribute()].values.tolist()
-    sensitive = test[single_sensitive].values.tolist()
 
-    predicted, params, predictions_list =  \
+    predicted, params, predictions_list, fit_stats =  \
         run_alg(algorithm, train, test, dataset, all_sensitive_attributes, single_sensitive,
                 privileged_vals, positive_val)
 
-    # make dictionary mapping sensitive names to sensitive attr test data lists
-    dict_sensitive_lists = {}
-    for sens in all_sensitive_attributes:
-        dict_sensitive_lists[sens] = test[sens].values.tolist()
+    if sensitive_groups is None:
+        sensitive_groups = get_sensitive_groups(test, all_sensitive_attributes)
 
     sensitive_dict = processed_data.get_sensitive_values(tag)
-    one_run_results = []
-    for metric in get_metrics(dataset, sensitive_dict, tag):
-        result = metric.calc(actual, predicted, dict_sensitive_lists, single_sensitive,
-                             privileged_vals, positive_val)
-        one_run_results.append(result)
+    metrics = get_metrics(dataset, sensitive_dict, tag)
 
-    # handling the set of predictions returned by ParamGridSearch
+    # handling the set of predictions returned by ParamGridSearch: the metrics matrix of all of
+    # them is calculated in one pass, and includes the results of the chosen predictions
+    one_run_results = None
     results_lol = []
     if len(predictions_list) > 0:
-        for param_name, param_val, predictions in predictions_list:
+        predictions_matrix = \
+            stack_predictions([predictions for _, _, predictions in predictions_list])
+        results_matrix = calc_metrics(metrics, actual, predictions_matrix, sensitive_groups,
+                                      single_sensitive, privileged_vals, positive_val)
+        for (param_name, param_val, predictions), results in \
+            zip(predictions_list, results_matrix):
             params_dict = { param_name : param_val }
-            results = []
-            for metric in get_metrics(dataset, sensitive_dict, tag):
-                result = metric.calc(actual, predictions, dict_sensitive_lists, single_sensitive,
-                                     privileged_vals, positive_val)
-                results.append(result)
             results_lol.append( (params_dict, results) )
+            if predictions is predicted:
+                one_run_results = results
+
+    if one_run_results is None:
+        one_run_results = calc_metrics(metrics, actual, predicted, sensitive_groups,
+                                       single_sensitive, privileged_vals, positive_val)
 
-    return params, one_run_results, results_lol
+    return params, one_run_results, results_lol, fit_stats
 
 def run_alg(algorithm, train, test, dataset, all_sensitive_attributes, single_sensitive,
             privileged_vals, positive_val):
@@ -145,7 +319,7 @@ def run_alg(algorithm, train, test, dataset, all_sensitive_attributes, single_se
         algorithm.run(train, test, class_attr, positive_val, all_sensitive_attributes,
                       single_sensitive, privileged_vals, params)
 
-    return predictions, params, predictions_list
+    return predictions, params, predictions_list, algorithm.get_fit_stats()
 
 
 def get_dict_sensitive_vals(dict_sensitive_lists):
@@ -159,8 +333,49 @@ def get_dict_sensitive_vals(dict_sensitive_lists):
          newdict[sens] = list(set(sensitive))
     return newdict
 
-def create_detailed_file(filename, dataset, sensitive_dict, tag):
-    return results.ResultsFile(filename, dataset, sensitive_dict, tag)
+def create_sync_policy(sync_rows, sync_seconds):
+    return results.SyncPolicy(sync_rows, sync_seconds)
+
+def create_results_writer(store, dataset_obj, processed_dataset, sensitive, tag, resume=False,
+                          sync_policy=None, param_algorithm=None):
+    """
+    Returns the writer of the results for the given sensitive attribute and tag in the given
+    store, or of the param results of param_algorithm's grid search if it is given.
+    """
+    sensitive_dict = processed_dataset.get_sensitive_values(tag)
+    table = 'results' if param_algorithm is None else 'param_results'
+    if store == 'sqlite':
+        return results_db.ResultsTable(table, dataset_obj, sensitive, sensitive_dict, tag, resume,
+                                       sync_policy)
+    if store == 'parquet':
+        return results_parquet.ResultsStore(table, dataset_obj, sensitive, sensitive_dict, tag,
+                                            resume, sync_policy)
+    if param_algorithm is None:
+        filename = dataset_obj.get_results_filename(sensitive, tag)
+    else:
+        filename = dataset_obj.get_param_results_filename(sensitive, tag, param_algorithm)
+    return create_detailed_file(filename, dataset_obj, sensitive_dict, tag, resume, sync_policy)
+
+def create_fit_stats_writer(store, dataset_obj, processed_dataset, sensitive, tag, resume=False,
+                            sync_policy=None):
+    """
+    Returns the writer of the statistics of the model fits (see Algorithm.get_fit_stats()) for the
+    given sensitive attribute and tag in the given store: rows keyed like the results, with one
+    column per name in FIT_STATS instead of the metrics.
+    """
+    sensitive_dict = processed_dataset.get_sensitive_values(tag)
+    if store == 'sqlite':
+        return results_db.ResultsTable('fit_stats', dataset_obj, sensitive, sensitive_dict, tag,
+                                       resume, sync_policy, columns=FIT_STATS)
+    if store == 'parquet':
+        return results_parquet.ResultsStore('fit_stats', dataset_obj, sensitive, sensitive_dict,
+                                            tag, resume, sync_policy, columns=FIT_STATS)
+    filename = dataset_obj.get_fit_stats_filename(sensitive, tag)
+    return results.ResultsFile(filename, dataset_obj, sensitive_dict, tag, resume, sync_policy,
+                               columns=FIT_STATS)
+
+def create_detailed_file(filename, dataset, sensitive_dict, tag, resume=False, sync_policy=None):
+    return results.ResultsFile(filename, dataset, sensitive_dict, tag, resume, sync_policy)
     # f = open(filename, 'w')
     # f.write(get_detailed_metrics_header(dataset, sensitive_dict, tag) + '\n')
     # return f
@@ -7,6 +7,7 @@ PACKAGE_DIR = pathlib.Path(__file__).parents[2]
 RAW_DATA_DIR = PACKAGE_DIR / 'data' / 'raw'
 PROCESSED_DATA_DIR = PACKAGE_DIR / 'data' / 'preprocessed'
 RESULT_DIR = BASE_DIR / "results"
+SPLIT_DIR = BASE_DIR / "splits"
 ANALYSIS_DIR = BASE_DIR / "analysis"
 
 
@@ -105,6 +106,19 @@ class Data():
         PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
         return PROCESSED_DATA_DIR / (self.get_dataset_name() + "_" + tag + '.csv')
 
+    def get_binary_filename(self, tag):
+        """
+        Returns the filename of the binary (pickled dataframe) copy of the processed data for the
+        tag, which is kept next to the CSV file.
+        """
+        PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        return PROCESSED_DATA_DIR / (self.get_dataset_name() + "_" + tag + '.pkl')
+
+    def get_splits_filename(self, seed, num_trials):
+        SPLIT_DIR.mkdir(parents=True, exist_ok=True)
+        return SPLIT_DIR / (self.get_dataset_name() + "_seed" + str(seed) + "_" + \
+               str(num_trials) + "trials.npz")
+
     def get_results_filename(self, sensitive_attr, tag):
         RESULT_DIR.mkdir(parents=True, exist_ok=True)
         return RESULT_DIR / (self.get_dataset_name() + "_" + sensitive_attr + "_" + tag + '.csv')
@@ -114,6 +128,11 @@ class Data():
         return RESULT_DIR / (algname + '_' + self.get_dataset_name() + "_" + sensitive_attr + \
                "_" + tag + '.csv')
 
+    def get_fit_stats_filename(self, sensitive_attr, tag):
+        RESULT_DIR.mkdir(parents=True, exist_ok=True)
+        return RESULT_DIR / (self.get_dataset_name() + "_" + sensitive_attr + "_" + tag + \
+               '_fit_stats.csv')
+
     def get_analysis_filename(self, sensitive_attr, tag):
         ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
         return ANALYSIS_DIR / (self.get_dataset_name() + "_" + sensitive_attr + "_" + tag + '.csv')
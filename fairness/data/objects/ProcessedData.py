@@ -1,48 +1,118 @@
+import os
+import tempfile
 import pandas as pd
 import numpy
 import numpy.random
 
+from fairness.metrics.SensitiveGroups import get_sensitive_groups
+
 TAGS = ["original", "numerical", "numerical-binsensitive", "categorical-binsensitive"]
 TRAINING_PERCENT = 2.0 / 3.0
 
 class ProcessedData():
-    def __init__(self, data_obj):
+    """
+    The processed versions of a dataset, one dataframe per tag.  Only the given tags are used, and
+    each tag's dataframe is read the first time it is needed.
+    """
+    def __init__(self, data_obj, tags=TAGS):
         self.data = data_obj
-        self.dfs = dict((k, pd.read_csv(self.data.get_filename(k)))
-                        for k in TAGS)
-        self.splits = dict((k, []) for k in TAGS)
+        self.tags = [k for k in TAGS if k in tags]
+        self.dfs = {}
+        self.splits = dict((k, []) for k in self.tags)
         self.has_splits = False
 
     def get_processed_filename(self, tag):
         return self.data.get_filename(tag)
 
+    def load_dataframe(self, tag):
+        """
+        Reads the processed data for the tag from its binary copy if that exists and is at least
+        as new as the CSV file, and from the CSV file otherwise.
+        """
+        filename = self.data.get_filename(tag)
+        binary_filename = self.data.get_binary_filename(tag)
+        if binary_filename.exists() and \
+           binary_filename.stat().st_mtime >= filename.stat().st_mtime:
+            try:
+                return pd.read_pickle(str(binary_filename))
+            except Exception as e:
+                print("Could not read %s, reading the CSV file instead: %s" % (binary_filename, e))
+        return pd.read_csv(filename)
+
     def get_dataframe(self, tag):
+        if not tag in self.dfs:
+            self.dfs[tag] = self.load_dataframe(tag)
         return self.dfs[tag]
 
-    def create_train_test_splits(self, num):
-        if self.has_splits:
-            return self.splits
+    def load_dataframes(self):
+        """
+        Reads the dataframes of all of the tags now instead of when they are first needed.
+        """
+        for tag in self.tags:
+            self.get_dataframe(tag)
 
-        for i in range(0, num):
-            # we first shuffle a list of indices so that each subprocessed data
-            # is split consistently
-            n = len(list(self.dfs.values())[0])
+    def create_train_test_splits(self, num, seed=None):
+        """
+        Returns a dictionary mapping each tag to a list of num TrainTestSplit objects, each of
+        which unpacks as a (train, test) pair of dataframes.  If
+        seed is given the shuffles are drawn from a generator seeded with it, so that the same
+        seed always gives the same splits, and the first i splits do not depend on num.
+        Otherwise the global numpy.random state is used.
+        """
+        if self.has_splits or len(self.tags) == 0:
+            return self.splits
 
-            a = numpy.arange(n)
-            numpy.random.shuffle(a)
+        # the same row indices are used for every tag so that each subprocessed data is split
+        # consistently
+        n = len(self.get_dataframe(self.tags[0]))
+        train_indices, test_indices = self.get_split_indices(n, num, seed)
 
-            split_ix = int(n * TRAINING_PERCENT)
-            train_fraction = a[:split_ix]
-            test_fraction = a[split_ix:]
-            
-            for (k, v) in self.dfs.items():
-                train = self.dfs[k].iloc[train_fraction]
-                test = self.dfs[k].iloc[test_fraction]
-                self.splits[k].append((train, test))
+        for train_fraction, test_fraction in zip(train_indices, test_indices):
+            for k in self.tags:
+                self.splits[k].append(TrainTestSplit(self, k, train_fraction, test_fraction))
 
         self.has_splits = True
         return self.splits
 
+    def get_split_indices(self, n, num, seed):
+        """
+        Returns a pair of int32 arrays with one row per split, holding the train and the test row
+        indices of that split.  Seeded splits are saved to the dataset's splits file and loaded
+        from it on later runs instead of being shuffled again.
+        """
+        filename = None
+        if seed is not None:
+            filename = self.data.get_splits_filename(seed, num)
+            try:
+                with numpy.load(str(filename)) as saved:
+                    train_indices, test_indices = saved['train'], saved['test']
+                if train_indices.shape[1] + test_indices.shape[1] == n:
+                    return train_indices, test_indices
+            except (IOError, KeyError, ValueError):
+                pass
+
+        random_state = numpy.random
+        if seed is not None:
+            random_state = numpy.random.RandomState(seed)
+
+        split_ix = int(n * TRAINING_PERCENT)
+        train_indices = numpy.empty((num, split_ix), dtype=numpy.int32)
+        test_indices = numpy.empty((num, n - split_ix), dtype=numpy.int32)
+        for i in range(0, num):
+            a = numpy.arange(n)
+            random_state.shuffle(a)
+            train_indices[i] = a[:split_ix]
+            test_indices[i] = a[split_ix:]
+
+        if filename is not None:
+            # write to a temporary file first so that concurrent runs never read a partial file
+            fd, tempname = tempfile.mkstemp(dir=str(filename.parent))
+            with os.fdopen(fd, "wb") as f:
+                numpy.savez(f, train=train_indices, test=test_indices)
+            os.replace(tempname, str(filename))
+
+        return train_indices, test_indices
+
     def get_sensitive_values(self, tag):
         """
         Returns a dictionary mapping sensitive attributes in the data to a list of all possible
@@ -55,3 +125,40 @@ class ProcessedData():
              sensdict[sens] = list(set(df[sens].values.tolist()))
         return sensdict
 
+
+class TrainTestSplit():
+    """
+    A single train/test split of the dataframe for one tag.  Only the row indices of the split are
+    kept; the train and test dataframes are built from the tag's dataframe each time they are
+    requested, so keeping all of the splits costs little more memory than the dataframe itself.
+
+    A split unpacks as a (train, test) pair:
+
+        train, test = split
+    """
+
+    def __init__(self, processed_data, tag, train_indices, test_indices):
+        self.processed_data = processed_data
+        self.tag = tag
+        self.train_indices = train_indices
+        self.test_indices = test_indices
+        self.sensitive_groups = None
+
+    def get_train(self):
+        return self.processed_data.get_dataframe(self.tag).iloc[self.train_indices]
+
+    def get_test(self):
+        return self.processed_data.get_dataframe(self.tag).iloc[self.test_indices]
+
+    def get_sensitive_groups(self, sensitive_attrs):
+        """
+        Returns the SensitiveGroups of the test set for the given sensitive attributes.  These are
+        computed on first use and then shared by every algorithm evaluated on this split.
+        """
+        if self.sensitive_groups is None or \
+           self.sensitive_groups.get_names() != list(sensitive_attrs):
+            self.sensitive_groups = get_sensitive_groups(self.get_test(), sensitive_attrs)
+        return self.sensitive_groups
+
+    def __iter__(self):
+        return iter((self.get_train(), self.get_test()))
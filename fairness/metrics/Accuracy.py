@@ -1,11 +1,11 @@
+from fairness.metrics.ConfusionCounts import divide, split_confusion
 from fairness.metrics.Metric import Metric
-from sklearn.metrics import accuracy_score
 
 class Accuracy(Metric):
     def __init__(self):
         Metric.__init__(self)
         self.name = 'accuracy'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        return accuracy_score(actual, predicted)
+    def calc_counts(self, counts):
+        TN, FP, FN, TP = split_confusion(counts.get_confusion())
+        return divide(TN + TP, TN + FP + FN + TP, float('nan'))
@@ -1,3 +1,5 @@
+import numpy
+
 from fairness.metrics.Metric import Metric
 
 class Average(Metric):
@@ -10,20 +12,18 @@ class Average(Metric):
           self.name = name
           self.metrics = metrics_list
 
-     def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-              unprotected_vals, positive_pred):
-
+     def calc_counts(self, counts):
           total = 0.0
           for metric in self.metrics:
-               result = metric.calc(actual, predicted, dict_of_sensitive_lists,
-                                    single_sensitive_name, unprotected_vals, positive_pred)
-               if result != None:
+               result = counts.evaluate(metric)
+               if result is not None:
                    total += result
 
-          if total == 0.0:
-               return 1.0
+          # numpy.where evaluates both branches, so the division must not fail on an empty list
+          return numpy.where(total == 0.0, 1.0, total / max(len(self.metrics), 1))
 
-          return total / len(self.metrics)
+     def get_key(self):
+          return (self.__class__, self.name, tuple(metric.get_key() for metric in self.metrics))
 
      def is_better_than(self, val1, val2):
           return self.metrics[0].is_better_than(val1, val2)
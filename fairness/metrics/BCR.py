@@ -7,13 +7,10 @@ class BCR(Metric):
         Metric.__init__(self)
         self.name = 'BCR'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
+    def calc_counts(self, counts):
         tnr = TNR()
-        tnr_val = tnr.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                           unprotected_vals, positive_pred)
+        tnr_val = counts.evaluate(tnr)
         tpr = TPR()
-        tpr_val = tpr.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                           unprotected_vals, positive_pred)
+        tpr_val = counts.evaluate(tpr)
         bcr = (tpr_val + tnr_val) / 2.0
         return bcr
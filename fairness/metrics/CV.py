@@ -10,11 +10,8 @@ class CV(Metric):
         Metric.__init__(self)
         self.name = 'CV'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        sensitive = dict_of_sensitive_lists[single_sensitive_name]
-        unprotected_pos_percent, protected_pos_percent = \
-            calc_pos_protected_percents(predicted, sensitive, unprotected_vals, positive_pred)
+    def calc_counts(self, counts):
+        unprotected_pos_percent, protected_pos_percent = calc_pos_protected_percents(counts)
         CV = unprotected_pos_percent - protected_pos_percent
         return 1.0 - CV
 
@@ -1,3 +1,4 @@
+from fairness.metrics.ConfusionCounts import divide, split_confusion
 from fairness.metrics.Metric import Metric
 
 class CalibrationNeg(Metric):
@@ -5,17 +6,6 @@ class CalibrationNeg(Metric):
           Metric.__init__(self)
           self.name = 'calibration-'
 
-     def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-              unprotected_vals, positive_pred):
-          total_pred_negative = 0.0
-          act_correct = 0.0
-          for act, pred in zip(actual, predicted):
-               if pred != positive_pred:
-                   total_pred_negative += 1
-                   if act == positive_pred:
-                        act_correct += 1
-          if act_correct == 0.0 and total_pred_negative == 0.0:
-               return 1.0
-          if total_pred_negative == 0.0:
-               return 0.0
-          return act_correct / total_pred_negative
+     def calc_counts(self, counts):
+          TN, FP, FN, TP = split_confusion(counts.get_confusion())
+          return divide(FN, FN + TN, 1.0)
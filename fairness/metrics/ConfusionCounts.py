@@ -0,0 +1,248 @@
+import numbers
+
+import numpy
+
+class ConfusionCounts:
+    """
+    The counts of actual against predicted classifications on a test set, computed once per
+    prediction vector and shared by all of the metrics evaluated on it.
+
+    The actual classifications and the predictions are encoded once as 0/1 arrays, and the
+    sensitive attributes are taken from a SensitiveGroups that is shared by all predictions on the
+    same test set.  Metrics then read the 2x2 confusion matrix of the whole set (get_confusion())
+    or one confusion matrix per sensitive value (get_group_confusion()).  Entry [a][p] of a
+    confusion matrix counts the items whose actual classification is (a = 1) or is not (a = 0)
+    positive_pred and whose prediction is (p = 1) or is not (p = 0) positive_pred, so
+    classification is assumed to be binary.
+
+    The predictions can also be a 2-D matrix with one set of predictions per row, e.g., one row
+    per parameter setting of a grid search.  All counts then have a leading dimension with one
+    entry per row, and metrics calculate one result per row in the same pass.
+
+    Metrics that only implement Metric.calc() are evaluated on the raw lists, which are kept
+    (and filtered on demand) for them.
+    """
+    def __init__(self, actual, predicted, sensitive_groups, single_sensitive_name,
+                 unprotected_vals, positive_pred):
+        self.single_sensitive_name = single_sensitive_name
+        self.unprotected_vals = unprotected_vals
+        self.positive_pred = positive_pred
+
+        self.actual = actual
+        self.predicted = predicted
+        self.sensitive_groups = sensitive_groups
+        self.rows = None    # indices into the lists above once this has been filtered
+        self.parent = None
+        self.parent_rows = None
+
+        self.actual_positive = equals(actual, positive_pred).astype(numpy.intp)
+        self.predicted_positive = equals(predicted, positive_pred).astype(numpy.intp)
+        self.batch_shape = self.predicted_positive.shape[:-1]
+        self.sensitive_codes = {}
+        self.confusion = None
+        self.group_confusion = {}
+        self.filtered = {}
+        self.results = {}
+
+    def evaluate(self, metric):
+        """
+        Returns metric.calc_counts() for these counts.  Results are remembered by metric key
+        (see Metric.get_key()), so that metrics shared between several expanded metrics, e.g., the
+        per-value metrics that ratios, differences and averages are built from, are only
+        calculated once.
+        """
+        key = metric.get_key()
+        if key not in self.results:
+            self.results[key] = metric.calc_counts(self)
+        return self.results[key]
+
+    def get_sensitive_codes(self, sensitive_name):
+        """
+        Returns (codes, values) for the given sensitive attribute as for
+        SensitiveGroups.get_codes(), restricted to the items counted here.
+        """
+        if sensitive_name not in self.sensitive_codes:
+            codes, values = self.sensitive_groups.get_codes(sensitive_name)
+            if self.rows is not None:
+                codes = codes[self.rows]
+            self.sensitive_codes[sensitive_name] = (codes, values)
+        return self.sensitive_codes[sensitive_name]
+
+    def get_values(self, sensitive_name):
+        """
+        Returns the list of distinct sensitive values for the given attribute, in the same order
+        as list(set(sensitive)) would give them for the list of sensitive values.
+        """
+        codes, values = self.get_sensitive_codes(sensitive_name)
+        present, first_seen = numpy.unique(codes, return_index=True)
+        return list(set(values[code] for code in present[numpy.argsort(first_seen)]))
+
+    def get_positives(self):
+        """
+        Returns the 0/1 arrays of actual and predicted positives for the items counted here.
+        """
+        if self.actual_positive is None:
+            self.actual_positive = self.parent.actual_positive[self.parent_rows]
+            self.predicted_positive = self.parent.predicted_positive[..., self.parent_rows]
+        return self.actual_positive, self.predicted_positive
+
+    def get_confusion(self):
+        """
+        Returns the 2x2 confusion matrix over all items.
+        """
+        if self.confusion is None:
+            self.confusion = count_confusion(*self.get_positives())
+        return self.confusion
+
+    def get_group_confusion(self, sensitive_name):
+        """
+        Returns (values, confusion) where confusion[i] is the 2x2 confusion matrix over the items
+        whose sensitive value for the given attribute is values[i].  Values that do not appear in
+        these items have all zero counts.
+        """
+        if sensitive_name not in self.group_confusion:
+            codes, values = self.get_sensitive_codes(sensitive_name)
+            actual_positive, predicted_positive = self.get_positives()
+            self.group_confusion[sensitive_name] = \
+                (values, count_confusion(actual_positive, predicted_positive, codes, len(values)))
+        return self.group_confusion[sensitive_name]
+
+    def filter(self, sensitive_name, sensitive_val):
+        """
+        Returns the counts restricted to the items whose value for the given sensitive attribute
+        equals sensitive_val, or None if there are no such items.
+        """
+        key = (sensitive_name, sensitive_val)
+        if key not in self.filtered:
+            self.filtered[key] = self.make_filtered(sensitive_name, sensitive_val)
+        return self.filtered[key]
+
+    def make_filtered(self, sensitive_name, sensitive_val):
+        rows = self.sensitive_groups.get_rows(sensitive_name, sensitive_val)
+        if self.rows is None:
+            parent_rows = rows
+        else:
+            parent_rows = numpy.flatnonzero(numpy.isin(self.rows, rows))
+            rows = self.rows[parent_rows]
+        if len(rows) < 1:
+            return None
+
+        filtered = ConfusionCounts.__new__(ConfusionCounts)
+        filtered.__dict__.update(self.__dict__)
+        filtered.rows = rows
+        filtered.parent = self
+        filtered.parent_rows = parent_rows
+        filtered.actual_positive = None
+        filtered.predicted_positive = None
+        filtered.sensitive_codes = {}
+        filtered.group_confusion = {}
+        filtered.filtered = {}
+        filtered.results = {}
+
+        # the filtered confusion matrix is looked up from the per-value counts of this one
+        matching = self.sensitive_groups.get_matching_codes(sensitive_name, sensitive_val)
+        values, group_confusion = self.get_group_confusion(sensitive_name)
+        filtered.confusion = group_confusion[..., matching, :, :].sum(axis=-3)
+        return filtered
+
+    def get_actual(self):
+        return self.get_raw_list(self.actual)
+
+    def get_predicted(self):
+        return self.get_raw_list(self.predicted)
+
+    def get_dict_of_sensitive_lists(self):
+        return dict((name, self.get_raw_list(self.sensitive_groups.get_list(name)))
+                    for name in self.sensitive_groups.get_names())
+
+    def get_raw_list(self, values):
+        if self.rows is None:
+            return values
+        return numpy.asarray(values, dtype=object)[..., self.rows].tolist()
+
+def equals(values, target):
+    """
+    Returns a boolean array that is True where the given value equals target.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind not in 'biuf' or not isinstance(target, numbers.Number):
+        values = values.astype(object)
+    return numpy.asarray(values == target, dtype=bool)
+
+def count_confusion(actual_positive, predicted_positive, codes=None, num_groups=None):
+    """
+    Counts the 2x2 confusion matrix of the given 0/1 arrays, or one such matrix per group if
+    integer group codes in the range [0, num_groups) are also given.  If predicted_positive is a
+    matrix, this counts each of its rows against actual_positive.
+    """
+    index = actual_positive * 2 + predicted_positive
+    shape = (2, 2)
+    if codes is not None:
+        index = index + codes * 4
+        shape = (num_groups, 2, 2)
+    # offset each row of predictions so that all rows are counted by one bincount
+    batch_shape = index.shape[:-1]
+    num_rows = int(numpy.prod(batch_shape))
+    size = int(numpy.prod(shape))
+    index = index + (numpy.arange(num_rows) * size).reshape(batch_shape + (1,))
+    return numpy.bincount(index.ravel(), minlength=num_rows * size).reshape(batch_shape + shape)
+
+def split_confusion(confusion):
+    """
+    Returns the (TN, FP, FN, TP) counts of the given confusion matrix (or matrices).
+    """
+    return confusion[..., 0, 0], confusion[..., 0, 1], confusion[..., 1, 0], confusion[..., 1, 1]
+
+def divide(numerator, denominator, zero_denominator_val):
+    """
+    Returns numerator / denominator as floats, with zero_denominator_val wherever the denominator
+    is zero.
+    """
+    numerator = numpy.asarray(numerator, dtype=numpy.float64)
+    denominator = numpy.asarray(denominator, dtype=numpy.float64)
+    is_zero = denominator == 0.0
+    return numpy.where(is_zero, zero_denominator_val,
+                       numerator / numpy.where(is_zero, 1.0, denominator))
+
+def as_result(value):
+    """
+    Converts a metric value computed from counts to the plain float (or None) that Metric.calc()
+    returns.
+    """
+    if value is None or numpy.ndim(value) > 0:
+        return value
+    return float(value)
+
+def as_results(value, batch_shape):
+    """
+    Converts a metric value computed from counts of a matrix of predictions to a list with one
+    plain float (or None) per row.
+    """
+    if value is None:
+        return [None] * int(numpy.prod(batch_shape))
+    return numpy.broadcast_to(numpy.asarray(value, dtype=numpy.float64), batch_shape).tolist()
+
+def stack_predictions(predictions_list):
+    """
+    Returns the given sets of predictions as a matrix with one set of predictions per row.
+    """
+    rows = [numpy.asarray(predictions) for predictions in predictions_list]
+    if len(set(row.dtype for row in rows)) > 1:
+        rows = [row.astype(object) for row in rows]
+    return numpy.stack(rows)
+
+def calc_metrics(metrics, actual, predicted, sensitive_groups, single_sensitive_name,
+                 unprotected_vals, positive_pred):
+    """
+    Evaluates all of the given metrics on the given predictions, counting the predictions once
+    and calculating each distinct (sub)metric once for all of them.  Returns the list of results,
+    or if predicted is a matrix with one set of predictions per row, the metrics matrix with one
+    list of results per row.
+    """
+    counts = ConfusionCounts(actual, predicted, sensitive_groups, single_sensitive_name,
+                             unprotected_vals, positive_pred)
+    if counts.batch_shape == ():
+        return [as_result(counts.evaluate(metric)) for metric in metrics]
+
+    columns = [as_results(counts.evaluate(metric), counts.batch_shape) for metric in metrics]
+    return [list(row) for row in zip(*columns)]
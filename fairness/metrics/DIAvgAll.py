@@ -1,5 +1,7 @@
 import math
+import numpy
 
+from fairness.metrics.ConfusionCounts import divide
 from fairness.metrics.utils import calc_prob_class_given_sensitive
 from fairness.metrics.Metric import Metric
 
@@ -15,10 +17,8 @@ class DIAvgAll(Metric):
         Metric.__init__(self)
         self.name = 'DIavgall'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        sensitive = dict_of_sensitive_lists[single_sensitive_name]
-        sensitive_values = list(set(sensitive))
+    def calc_counts(self, counts):
+        sensitive_values = counts.get_values(counts.single_sensitive_name)
 
         if len(sensitive_values) <= 1:
              print("ERROR: Attempted to calculate DI without enough sensitive values:" + \
@@ -26,24 +26,18 @@ class DIAvgAll(Metric):
              return 1.0
 
         # this list should only have one item in it
-        single_unprotected = [val for val in sensitive_values if val in unprotected_vals][0]
-        unprotected_prob = calc_prob_class_given_sensitive(predicted, sensitive, positive_pred,
-                                                           single_unprotected)
+        single_unprotected = \
+            [val for val in sensitive_values if val in counts.unprotected_vals][0]
+        unprotected_prob = calc_prob_class_given_sensitive(counts, single_unprotected)
         sensitive_values.remove(single_unprotected)
         total = 0.0
         for sens in sensitive_values:
-             pos_prob = calc_prob_class_given_sensitive(predicted, sensitive, positive_pred, sens)
-             DI = 0.0
-             if unprotected_prob > 0:
-                 DI = pos_prob / unprotected_prob
-             if unprotected_prob == 0.0 and pos_prob == 0.0:
-                 DI = 1.0
+             pos_prob = calc_prob_class_given_sensitive(counts, sens)
+             DI = divide(pos_prob, unprotected_prob, 0.0)
+             DI = numpy.where((unprotected_prob == 0.0) & (pos_prob == 0.0), 1.0, DI)
              total += DI
 
-        if total == 0.0:
-             return 1.0
-
-        return total / len(sensitive_values)
+        return numpy.where(total == 0.0, 1.0, total / len(sensitive_values))
 
     def is_better_than(self, val1, val2):
         dist1 = math.fabs(1.0 - val1)
@@ -1,5 +1,7 @@
 import math
+import numpy
 
+from fairness.metrics.ConfusionCounts import divide
 from fairness.metrics.utils import calc_pos_protected_percents
 from fairness.metrics.Metric import Metric
 
@@ -16,17 +18,11 @@ class DIBinary(Metric):
         Metric.__init__(self)
         self.name = 'DIbinary'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        sensitive = dict_of_sensitive_lists[single_sensitive_name]
-        unprotected_pos_percent, protected_pos_percent = \
-            calc_pos_protected_percents(predicted, sensitive, unprotected_vals, positive_pred)
-        DI = 0.0
-        if unprotected_pos_percent > 0:
-            DI = protected_pos_percent / unprotected_pos_percent
-        if unprotected_pos_percent == 0.0 and protected_pos_percent == 0.0:
-            DI = 1.0
-        return DI
+    def calc_counts(self, counts):
+        unprotected_pos_percent, protected_pos_percent = calc_pos_protected_percents(counts)
+        DI = divide(protected_pos_percent, unprotected_pos_percent, 0.0)
+        return numpy.where((unprotected_pos_percent == 0.0) & (protected_pos_percent == 0.0),
+                           1.0, DI)
 
     def is_better_than(self, val1, val2):
         dist1 = math.fabs(1.0 - val1)
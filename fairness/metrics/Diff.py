@@ -1,3 +1,5 @@
+import math
+
 from fairness.metrics.Metric import Metric
 
 class Diff(Metric):
@@ -7,12 +9,9 @@ class Diff(Metric):
           self.metric2 = metric2
           self.name = "diff:" + self.metric1.get_name() + 'to' + self.metric2.get_name()
 
-     def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-              unprotected_vals, positive_pred):
-          m1 = self.metric1.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                                 unprotected_vals, positive_pred)
-          m2 = self.metric2.calc(actual, predicted, dict_of_sensitive_lists,
-                                 single_sensitive_name, unprotected_vals, positive_pred)
+     def calc_counts(self, counts):
+          m1 = counts.evaluate(self.metric1)
+          m2 = counts.evaluate(self.metric2)
 
           if m1 is None or m2 is None:
                return None
@@ -20,6 +19,9 @@ class Diff(Metric):
           diff = m1 - m2
           return 1.0 - diff
 
+     def get_key(self):
+          return (self.__class__, self.metric1.get_key(), self.metric2.get_key())
+
      def is_better_than(self, val1, val2):
          """
          Assumes that 1.0 is the goal value.
@@ -11,12 +11,9 @@ class EqOppo_fn_diff(Metric):
         Metric.__init__(self)
         self.name = 'EqOppo_fn_diff'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        sensitive = dict_of_sensitive_lists[single_sensitive_name]
-        fp_unprotected, fp_protected, fn_protected, fn_unprotected = \
-            calc_fp_fn(actual, predicted, sensitive, unprotected_vals, positive_pred)
+    def calc_counts(self, counts):
+        fp_unprotected, fp_protected, fn_protected, fn_unprotected = calc_fp_fn(counts)
 
-        fn_diff = math.fabs(fn_protected-fn_unprotected)
+        fn_diff = numpy.fabs(fn_protected-fn_unprotected)
 
         return fn_diff
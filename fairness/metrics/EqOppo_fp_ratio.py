@@ -3,6 +3,7 @@ import math
 import sys
 import numpy
 
+from fairness.metrics.ConfusionCounts import divide
 from fairness.metrics.utils import calc_fp_fn
 from fairness.metrics.Metric import Metric
 
@@ -11,15 +12,7 @@ class EqOppo_fp_ratio(Metric):
         Metric.__init__(self)
         self.name = 'EqOppo_fp_ratio'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        sensitive = dict_of_sensitive_lists[single_sensitive_name]
-
-        fp_unprotected,fp_protected, fn_protected, fn_unprotected = \
-        calc_fp_fn(actual, predicted, sensitive, unprotected_vals, positive_pred)
-        fp_ratio=0.0
-        if fp_unprotected > 0:
-            fp_ratio= fp_protected/fp_unprotected
-        if fp_unprotected == 0.0 and fp_protected == 0.0:
-            fp_ratio=1.0
-        return fp_ratio
+    def calc_counts(self, counts):
+        fp_unprotected, fp_protected, fn_protected, fn_unprotected = calc_fp_fn(counts)
+        fp_ratio = divide(fp_protected, fp_unprotected, 0.0)
+        return numpy.where((fp_unprotected == 0.0) & (fp_protected == 0.0), 1.0, fp_ratio)
@@ -6,9 +6,7 @@ class FNR(Metric):
         Metric.__init__(self)
         self.name = 'FNR'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
+    def calc_counts(self, counts):
         tpr = TPR()
-        tpr_val = tpr.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                           unprotected_vals, positive_pred)
+        tpr_val = counts.evaluate(tpr)
         return 1 - tpr_val
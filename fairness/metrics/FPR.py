@@ -6,9 +6,7 @@ class FPR(Metric):
         Metric.__init__(self)
         self.name = 'FPR'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
+    def calc_counts(self, counts):
         tnr = TNR()
-        tnr_val = tnr.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                           unprotected_vals, positive_pred)
+        tnr_val = counts.evaluate(tnr)
         return 1 - tnr_val
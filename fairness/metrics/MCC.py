@@ -1,11 +1,21 @@
+import numpy
+
+from fairness.metrics.ConfusionCounts import divide
 from fairness.metrics.Metric import Metric
-from sklearn.metrics import matthews_corrcoef
 
 class MCC(Metric):
     def __init__(self):
         Metric.__init__(self)
         self.name = 'MCC'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        return matthews_corrcoef(actual, predicted)
+    def calc_counts(self, counts):
+        # the same computation as sklearn.metrics.matthews_corrcoef on the confusion matrix
+        confusion = counts.get_confusion().astype(numpy.float64)
+        t_sum = confusion.sum(axis=-1)
+        p_sum = confusion.sum(axis=-2)
+        n_correct = confusion[..., 0, 0] + confusion[..., 1, 1]
+        n_samples = p_sum.sum(axis=-1)
+        cov_ytyp = n_correct * n_samples - (t_sum * p_sum).sum(axis=-1)
+        cov_ypyp = n_samples ** 2 - (p_sum * p_sum).sum(axis=-1)
+        cov_ytyt = n_samples ** 2 - (t_sum * t_sum).sum(axis=-1)
+        return divide(cov_ytyp, numpy.sqrt(cov_ytyt * cov_ypyp), 0.0)
@@ -1,3 +1,8 @@
+import numpy
+
+from fairness.metrics.ConfusionCounts import ConfusionCounts, as_result
+from fairness.metrics.SensitiveGroups import SensitiveGroups
+
 class Metric:
     def __init__(self):
         self.name = 'Name not implemented'  ## This should be replaced in implemented metrics.
@@ -31,8 +36,48 @@ class Metric:
 
         If there is an error and the metric can not be calculated (e.g., no data is passed in), the
         metric returns None.
+
+        Metrics implement either this or calc_counts().  By default, this evaluates calc_counts()
+        on the counts of the given lists.
+        """
+        if type(self).calc_counts is Metric.calc_counts:
+            raise NotImplementedError("calc() in Metric is not implemented")
+        counts = ConfusionCounts(actual, predicted, SensitiveGroups(dict_of_sensitive_lists),
+                                 single_sensitive_name, unprotected_vals, positive_pred)
+        return as_result(counts.evaluate(self))
+
+    def calc_counts(self, counts):
+        """
+        counts                          a ConfusionCounts over the actual and predicted results
+                                        on the test set
+
+        returns                         the calculated result for this metric, as for calc(), or
+                                        an array of results with one per row if the counts are
+                                        over a matrix of predictions
+
+        This lets all metrics evaluated on the same predictions share one encoding of them.  By
+        default, this calls calc() on the lists the counts were made from (once per row of a
+        matrix of predictions, with None results given as NaN).
+        """
+        args = (counts.get_dict_of_sensitive_lists(), counts.single_sensitive_name,
+                counts.unprotected_vals, counts.positive_pred)
+        if counts.batch_shape == ():
+            return self.calc(counts.get_actual(), counts.get_predicted(), *args)
+
+        # one call per row of a matrix of predictions
+        results = [self.calc(counts.get_actual(), predicted, *args)
+                   for predicted in counts.get_predicted()]
+        if all(result is None for result in results):
+            return None
+        return numpy.array([numpy.nan if result is None else result for result in results])
+
+    def get_key(self):
+        """
+        Returns a hashable key for the calculation this metric performs.  Metrics with equal keys
+        are assumed to give the same result on the same counts, so that it is only calculated once
+        (see ConfusionCounts.evaluate()).  By default, this is the metric class and name.
         """
-        raise NotImplementedError("calc() in Metric is not implemented")
+        return (self.__class__, self.get_name())
 
     def get_name(self):
         """
@@ -1,3 +1,7 @@
+import math
+import numpy
+
+from fairness.metrics.ConfusionCounts import divide
 from fairness.metrics.Metric import Metric
 
 class Ratio(Metric):
@@ -7,21 +11,18 @@ class Ratio(Metric):
           self.denominator = metric_denominator
           self.name = self.numerator.get_name() + '_over_' + self.denominator.get_name()
 
-     def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-              unprotected_vals, positive_pred):
-          num = self.numerator.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                                    unprotected_vals, positive_pred)
-          den = self.denominator.calc(actual, predicted, dict_of_sensitive_lists,
-                                      single_sensitive_name, unprotected_vals, positive_pred)
+     def calc_counts(self, counts):
+          num = counts.evaluate(self.numerator)
+          den = counts.evaluate(self.denominator)
 
           if num is None or den is None:
                return None
 
-          if num == 0.0 and den == 0.0:
-               return 1.0
-          if den == 0.0:
-               return 0.0
-          return num / den
+          ratio = divide(num, den, 0.0)
+          return numpy.where((num == 0.0) & (den == 0.0), 1.0, ratio)
+
+     def get_key(self):
+          return (self.__class__, self.numerator.get_key(), self.denominator.get_key())
 
      def is_better_than(self, val1, val2):
          """
@@ -0,0 +1,78 @@
+import numpy
+import pandas
+
+class SensitiveGroups:
+    """
+    The items of a test set grouped by the value of each sensitive attribute (including the joint
+    attribute).  This depends only on the test set, so it is computed once per train/test split
+    and shared by the metric evaluations of every algorithm run on that split.
+
+    Each attribute is encoded as an integer array of codes, one per item, where code i stands for
+    the i-th distinct value in order of first appearance.  Missing values (NaN) share the last
+    code, which stands for a NaN value that equals no value, so that they form a group of their
+    own that is never privileged.  The sorted row indices of each value are kept once they have
+    been asked for.
+    """
+    def __init__(self, dict_of_sensitive_lists):
+        """
+        dict_of_sensitive_lists         dict mapping sensitive attr names to a list (or array or
+                                        Series) of sensitive vals
+        """
+        self.dict_of_sensitive_lists = dict_of_sensitive_lists
+        self.codes = {}
+        self.lists = {}
+        self.rows = {}
+
+    def get_names(self):
+        return list(self.dict_of_sensitive_lists)
+
+    def get_list(self, sensitive_name):
+        """
+        Returns the sensitive values of the given attribute as a list.
+        """
+        if sensitive_name not in self.lists:
+            values = self.dict_of_sensitive_lists[sensitive_name]
+            self.lists[sensitive_name] = values if isinstance(values, list) else values.tolist()
+        return self.lists[sensitive_name]
+
+    def get_codes(self, sensitive_name):
+        """
+        Returns (codes, values) for the given sensitive attribute, where codes is an integer array
+        with one entry per item and values[code] is the sensitive value that the code stands for.
+        """
+        if sensitive_name not in self.codes:
+            sensitive = self.dict_of_sensitive_lists[sensitive_name]
+            codes, uniques = pandas.factorize(pandas.Series(sensitive))
+            values = uniques.tolist()
+            # factorize gives missing values the code -1, which would count them as the last value
+            missing = codes == -1
+            if missing.any():
+                codes = numpy.where(missing, len(values), codes)
+                values.append(float('nan'))
+            self.codes[sensitive_name] = (codes, values)
+        return self.codes[sensitive_name]
+
+    def get_matching_codes(self, sensitive_name, sensitive_val):
+        """
+        Returns the list of codes whose value equals sensitive_val.
+        """
+        codes, values = self.get_codes(sensitive_name)
+        return [code for code, value in enumerate(values) if value == sensitive_val]
+
+    def get_rows(self, sensitive_name, sensitive_val):
+        """
+        Returns the sorted indices of the items whose value for the given sensitive attribute
+        equals sensitive_val.
+        """
+        key = (sensitive_name, sensitive_val)
+        if key not in self.rows:
+            codes, values = self.get_codes(sensitive_name)
+            matching = self.get_matching_codes(sensitive_name, sensitive_val)
+            self.rows[key] = numpy.flatnonzero(numpy.isin(codes, matching))
+        return self.rows[key]
+
+def get_sensitive_groups(df, sensitive_attrs):
+    """
+    Returns the SensitiveGroups of the given dataframe for the given sensitive attributes.
+    """
+    return SensitiveGroups(dict((attr, df[attr].values) for attr in sensitive_attrs))
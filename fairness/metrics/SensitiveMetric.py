@@ -25,12 +25,13 @@ class SensitiveMetric(Metric):
           self.metric = metric_class
           self.name = self.metric().get_name()   # to be modified as this metric is expanded
 
-     def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-              unprotected_vals, positive_pred):
+     def calc_counts(self, counts):
           sfilter = FilterSensitive(self.metric())
           sfilter.set_sensitive_to_filter(self.sensitive_attr, self.sensitive_val)
-          return sfilter.calc(actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-                              unprotected_vals, positive_pred)
+          return counts.evaluate(sfilter)
+
+     def get_key(self):
+          return (self.__class__, self.metric, self.sensitive_attr, self.sensitive_val)
 
      def expand_per_dataset(self, dataset, sensitive_dict, tag):
           objects_list = []
@@ -41,20 +42,30 @@ class SensitiveMetric(Metric):
      def make_metric_objects(self, sensitive_name, sensitive_values, dataset, tag):
           privileged_val = self.get_privileged_for_attr(sensitive_name, dataset, tag)
 
+          # the per-value metrics are shared by the ratios, diffs and averages built from them, so
+          # that each is calculated once per set of predictions (see ConfusionCounts.evaluate())
+          sensitive_objs = {}
+          def get_sensitive_obj(val):
+              if val not in sensitive_objs:
+                  sensitive_objs[val] = self.make_sensitive_obj(sensitive_name, val)
+              return sensitive_objs[val]
+
           objs_list = []
           ratios_list = []
           diff_list = []
           for val in sensitive_values[sensitive_name]:
               # adding sensitive variants of the given metric to the objects list
-              objs_list.append(self.make_sensitive_obj(sensitive_name, val))
+              objs_list.append(get_sensitive_obj(val))
 
               # adding ratio of sensitive variants of the given metric to the ratios list
               if val != privileged_val:
-                  ratios_list.append(self.make_ratio_obj(sensitive_name, val, privileged_val))
+                  ratios_list.append(Ratio(get_sensitive_obj(val),
+                                           get_sensitive_obj(privileged_val)))
 
               # adding diff of sensitive variants of given metric to the diff list
               if val != privileged_val:
-                  diff_list.append(self.make_diff_obj(sensitive_name, val, privileged_val))
+                  diff_list.append(Diff(get_sensitive_obj(privileged_val),
+                                        get_sensitive_obj(val)))
           avg = Average(objs_list, sensitive_name + '-' + self.metric().get_name())
           ratio_avg = Average(ratios_list, sensitive_name + '-' + self.metric().get_name() + 'Ratio')
           diff_avg = Average(diff_list, sensitive_name + '-' + self.metric().get_name() + 'Diff')
@@ -65,16 +76,6 @@ class SensitiveMetric(Metric):
           obj.set_sensitive_to_filter(sensitive_attr, sensitive_val)
           return obj
 
-     def make_ratio_obj(self, sensitive_attr, sensitive_val, privileged):
-          privileged_metric = self.make_sensitive_obj(sensitive_attr, privileged)
-          unprivileged_metric = self.make_sensitive_obj(sensitive_attr, sensitive_val)
-          return Ratio(unprivileged_metric, privileged_metric)
-
-     def make_diff_obj(self, sensitive_attr, sensitive_val, privileged):
-          privileged_metric = self.make_sensitive_obj(sensitive_attr, privileged)
-          unprivileged_metric = self.make_sensitive_obj(sensitive_attr, sensitive_val)
-          return Diff(privileged_metric, unprivileged_metric)
-
      def get_privileged_for_attr(self, sensitive_attr, dataset, tag):
           sensitive_attributes = dataset.get_sensitive_attributes_with_joint()
           privileged_vals = dataset.get_privileged_class_names_with_joint(tag)
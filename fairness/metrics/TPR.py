@@ -1,5 +1,5 @@
+from fairness.metrics.ConfusionCounts import divide, split_confusion
 from fairness.metrics.Metric import Metric
-from sklearn.metrics import recall_score
 
 class TPR(Metric):
     """
@@ -10,7 +10,6 @@ class TPR(Metric):
         Metric.__init__(self)
         self.name = 'TPR'
 
-    def calc(self, actual, predicted, dict_of_sensitive_lists, single_sensitive_name,
-             unprotected_vals, positive_pred):
-        return recall_score(actual, predicted, pos_label=positive_pred, average='binary')
-
+    def calc_counts(self, counts):
+        TN, FP, FN, TP = split_confusion(counts.get_confusion())
+        return divide(TP, TP + FN, 0.0)
@@ -15,11 +15,21 @@ def prepare_data(dataset_names = get_dataset_names()):
         
         for k, v in d.items():
             write_to_file(dataset.get_filename(k), v)
+            write_to_binary_file(dataset.get_binary_filename(k), dataset.get_filename(k))
 
 def write_to_file(filename, dataframe):
     print("Writing data to: %s" % filename)
     dataframe.to_csv(filename, index = False)
 
+def write_to_binary_file(filename, csv_filename):
+    """
+    Writes a binary copy of the given CSV file, which ProcessedData loads instead of parsing the
+    CSV.  The copy is made from the CSV as read back by pandas so that it has exactly the same
+    columns and dtypes that reading the CSV gives.
+    """
+    print("Writing data to: %s" % filename)
+    pd.read_csv(csv_filename).to_pickle(str(filename))
+
 def preprocess(dataset, data_frame):
     """
     The preprocess function takes a pandas data frame and returns two modified data frames:
@@ -1,7 +1,13 @@
+import contextlib
+import fcntl
 import pathlib
 import os
+import socket
+import sqlite3
 import tempfile
-import shutil
+import threading
+import time
+import uuid
 
 from fairness.metrics.list import get_metrics
 
@@ -24,74 +30,473 @@ def get_metrics_list(dataset, sensitive_dict, tag):
 
 def get_detailed_metrics_header(dataset, sensitive_dict, tag):
     return ','.join(['algorithm', 'params', 'run-id'] + get_metrics_list(dataset, sensitive_dict, tag))
-    
+
+SYNC_ROWS_DEFAULT = None
+SYNC_SECONDS_DEFAULT = 10.0
+
+class SyncPolicy(object):
+    """
+    How often a ResultsFile syncs the rows written to its journal to disk: once rows rows or
+    seconds seconds have gone by since the last sync, whichever comes first.  The seconds are
+    kept by a SyncTimer, so they hold even if no further row is written, e.g., while a long work
+    unit runs.  If both are None, the journal is only synced by close().
+
+    Rows are handed to the operating system as soon as they are written, so a crash of the
+    benchmark itself loses nothing; a crash of the machine loses at most the rows written since
+    the last sync.  The default syncs at most every SYNC_SECONDS_DEFAULT seconds, since syncing
+    every row is slow on network and container filesystems.
+    """
+
+    def __init__(self, rows=SYNC_ROWS_DEFAULT, seconds=SYNC_SECONDS_DEFAULT):
+        self.rows = rows
+        self.seconds = seconds
+
+    def is_due(self, unsynced_rows, unsynced_seconds):
+        if self.rows is not None and unsynced_rows >= self.rows:
+            return True
+        return self.seconds is not None and unsynced_seconds >= self.seconds
+
+class SyncTimer(object):
+    """
+    Syncs the rows that a writer (a ResultsFile, or its counterparts in results_db and
+    results_parquet) leaves unsynced once the seconds of its SyncPolicy have gone by since its
+    last sync, by calling its sync() from a timer thread.  The writer holds lock while it writes
+    rows, syncs or closes, so that the timer never runs at the same time.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = threading.RLock()
+        self.timer = None
+
+    def row_written(self):
+        """
+        Syncs the writer if its SyncPolicy says so, or otherwise starts the timer for its unsynced
+        rows if it is not running yet.  Called by the writer, holding lock, after each row.
+        """
+        writer = self.writer
+        unsynced_seconds = time.monotonic() - writer.last_sync
+        if writer.sync_policy.is_due(writer.unsynced_rows, unsynced_seconds):
+            writer.sync()
+        elif self.timer is None and writer.sync_policy.seconds is not None:
+            self.timer = threading.Timer(writer.sync_policy.seconds - unsynced_seconds,
+                                         self.sync_when_due)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def sync_when_due(self):
+        with self.lock:
+            # the writer may have synced or closed since this timer went off
+            if self.timer is threading.current_thread():
+                self.writer.sync()
+
+    def cancel(self):
+        """
+        Stops the timer.  Called by the writer, holding lock, when it syncs or closes.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
 class ResultsFile(object):
+    """
+    Collects result rows for one results file.  New rows are appended to a journal file next to
+    the results file as they are written, and are merged into the results file on close().
+
+    Several processes, possibly on different machines sharing the results directory, can write to
+    the same results file at once: each has its own journal (see get_journal_filename()), which it
+    holds a lock on while it runs, and the merges are serialized by a lock on the results file
+    (see lock_results()).
+
+    If resume is True, the journals left behind by interrupted runs, i.e., those that no running
+    process holds a lock on, are merged into the results file first, and has_result() reports the
+    (algorithm, run-id) pairs already present in it so that the caller can skip them.
 
-    def __init__(self, filename, dataset, sensitive_dict, tag):
+    The journal is synced to disk according to the given SyncPolicy.  The columns after the key
+    columns are the given columns, by default the metrics of the dataset and tag.
+    """
+
+    def __init__(self, filename, dataset, sensitive_dict, tag, resume=False, sync_policy=None,
+                 columns=None):
         self.filename = filename
         self.dataset = dataset
         self.sensitive_dict = sensitive_dict
         self.tag = tag
-        handle, name = self.create_new_file()
-        self.fresh_file = handle
-        self.tempname = name
-
-    def create_new_file(self):
-        fd, name = tempfile.mkstemp()
-        os.close(fd)
-        f = open(name, "w")
-        f.write(get_detailed_metrics_header(
-            self.dataset, self.sensitive_dict, self.tag) + '\n')
-        return f, name
+        self.columns = columns if columns is not None else \
+                       get_metrics_list(dataset, sensitive_dict, tag)
+        self.journalname = get_journal_filename(filename)
+        self.sync_policy = sync_policy if sync_policy is not None else SyncPolicy()
+        self.sync_timer = SyncTimer(self)
+        self.unsynced_rows = 0
+        self.last_sync = time.monotonic()
+        self.finished = set()
+        if resume:
+            self.merge_orphaned_journals()
+            self.finished = read_finished_keys(self.filename)
+        self.fresh_file = self.open_journal()
+
+    def open_journal(self):
+        # the name is unique, but an existing journal must never be truncated
+        f = open(self.journalname, "x")
+        try_lock(f)
+        open_journals.add(self.journalname)
+        f.write(','.join(['algorithm', 'params', 'run-id'] + self.columns) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+        return f
+
+    def merge_orphaned_journals(self):
+        """
+        Merges the journals of this results file that no running process holds a lock on into the
+        results file, and removes them.
+        """
+        for journalname in get_journal_filenames(self.filename):
+            # POSIX locks do not exclude this process, which may have its own writers running
+            if journalname == self.journalname or journalname in open_journals:
+                continue
+            try:
+                f = open(journalname, "r+")
+            except FileNotFoundError:
+                continue
+            with f:
+                if not try_lock(f):
+                    continue # its writer is still running
+                with lock_results(self.filename):
+                    # another resumed run may have merged it since it was listed
+                    if not os.path.exists(journalname):
+                        continue
+                    # a journal without rows may not even have a whole header
+                    if len(read_finished_keys(journalname)) > 0:
+                        self.merge_journal(journalname)
+                    os.unlink(journalname)
+
+    def has_result(self, alg_name, run_id):
+        return (alg_name, str(run_id)) in self.finished
+
+    def write_results(self, alg_name, params, run_id, results_list):
+        line = alg_name + ','
+        line += format_params(params) + (',%s,' % run_id)
+        line += ','.join(str(x) for x in results_list) + '\n'
+        self.write(line)
 
     def write(self, *args):
-        self.fresh_file.write(*args)
-        self.fresh_file.flush()
-        os.fsync(self.fresh_file.fileno())
+        with self.sync_timer.lock:
+            self.fresh_file.write(*args)
+            self.fresh_file.flush()
+            self.unsynced_rows += 1
+            self.sync_timer.row_written()
+
+    def sync(self):
+        with self.sync_timer.lock:
+            self.sync_timer.cancel()
+            os.fsync(self.fresh_file.fileno())
+            self.unsynced_rows = 0
+            self.last_sync = time.monotonic()
 
-    # FIXME close() is terribly inefficient, but :shrug:
     def close(self):
-        self.fresh_file.close()
+        """
+        Merges the journal into the results file and removes it.  The journal stays locked until
+        it is removed, so that a resumed run never merges it a second time.
+        """
+        with self.sync_timer.lock:
+            self.sync_timer.cancel()
+            self.fresh_file.flush()
+            with lock_results(self.filename):
+                self.merge_journal(self.journalname)
+                os.unlink(self.journalname)
+            self.fresh_file.close()
+            open_journals.discard(self.journalname)
 
-        new_file = open(self.tempname, "r")
-        new_columns = new_file.readline().strip().split(',')
-        new_rows = new_file.readlines()
+    def merge_journal(self, journalname):
+        """
+        Merges the given journal into the results file; the caller holds the results file lock.
+        Rows are keyed by (algorithm, params, run-id): a new row replaces the values of an
+        existing row with the same key, and the results file ends up with the union of the old
+        and new columns.  A partially written last row of the journal is dropped.
 
-        try:
-            old_file = open(self.filename, "r")
-            old_columns = old_file.readline().strip().split(',')
-            old_rows = old_file.readlines()
-        except FileNotFoundError:
-            old_columns = new_columns[:3] # copy the key columns
-            old_rows = []
+        A key index next to the results file holds the keys it has (see open_key_index()).  If it
+        is up to date, no new row replaces an existing one and there are no new columns, the new
+        rows are appended in place, which takes time proportional to the new rows (see
+        append_rows()).  Otherwise the results file is rewritten, streaming the old rows through
+        the merge.
+        """
+        new_columns = read_header(journalname)
+        # later rows with the same key replace earlier ones
+        new_indexed_rows = dict(read_indexed_rows(journalname))
 
+        old_columns = read_header(self.filename)
+        if old_columns is None:
+            old_columns = new_columns[:3] # copy the key columns
         final_columns = set(old_columns).union(set(new_columns))
-        
-        # FIXME: here we cross our fingers that parameters don't have "," in them.
-        def indexed_rows(rows, column_names):
-            result = {}
-            for row in rows:
-                entries = row.strip().split(',')
-                result[tuple(entries[:3])] = dict(
-                    (entry_name, entry)
-                    for (entry_name, entry) in
-                    zip(column_names, entries))
-            return result
-
-        old_indexed_rows = indexed_rows(old_rows, old_columns)
-        # now we merge the rows onto the old file.
-        for (key, value_dict) in indexed_rows(new_rows, new_columns).items():
-            for (value_name, value) in value_dict.items():
-                old_indexed_rows.setdefault(key, {})[value_name] = value
-
-        fd, final_tempname = tempfile.mkstemp()
-        os.close(fd)
-        final_file = open(final_tempname, "w")
         final_columns_list = ["algorithm", "params", "run-id"] + \
             sorted(list(final_columns.difference(set(["algorithm", "params", "run-id"]))))
-        final_file.write(",".join(final_columns_list) + "\n")
-        for row_dict in old_indexed_rows.values():
-            row = ",".join(list(row_dict.get(l, "") for l in final_columns_list))
-            final_file.write(row + "\n")
+
+        index = open_key_index(self.filename)
+        try:
+            if index is None:
+                # no index, or it describes another version of the results file
+                append = False
+            elif final_columns_list != old_columns:
+                append = False
+            elif not ends_with_complete_row(self.filename):
+                # a partially written last row, which only a rewrite drops
+                append = False
+            else:
+                append = not key_index_has_any(index, new_indexed_rows)
+            if append:
+                self.append_rows(new_indexed_rows, final_columns_list, index)
+        finally:
+            if index is not None:
+                index.close()
+        if not append:
+            self.rewrite_rows(new_indexed_rows, final_columns_list)
+
+    def append_rows(self, new_indexed_rows, columns, index):
+        """
+        Appends the given rows, whose keys are not in the results file, to the results file,
+        which already has the given columns, and adds their keys to the given key index.  The
+        index records the size of the results file before the rows are appended, so that if this
+        is interrupted, the next merge truncates the results file back to it (see
+        open_key_index()); the rows are still in the journal, which is removed only after this.
+        """
+        start_key_index_append(index)
+        fd = os.open(str(self.filename), os.O_WRONLY | os.O_APPEND)
+        with os.fdopen(fd, "w") as final_file:
+            for row_dict in new_indexed_rows.values():
+                final_file.write(format_row(row_dict, columns))
+            final_file.flush()
+            os.fsync(final_file.fileno())
+        append_key_index(index, self.filename, new_indexed_rows.keys())
+
+    def rewrite_rows(self, new_indexed_rows, columns):
+        """
+        Writes the merge of the results file and the given rows to a new results file, which
+        atomically replaces the old one, and writes its key index.
+        """
+        # the merged file is synced before it replaces the results file, and the journal is only
+        # removed after that, so a crash leaves either the old or the new results file and the
+        # journal
+        fd, final_tempname = tempfile.mkstemp(dir=os.path.dirname(str(self.filename)))
+        final_file = os.fdopen(fd, "w")
+        final_file.write(",".join(columns) + "\n")
+        keys = []
+        merged = set()
+        for key, row_dict in read_indexed_rows(self.filename):
+            if key in new_indexed_rows:
+                row_dict.update(new_indexed_rows[key])
+                merged.add(key)
+            final_file.write(format_row(row_dict, columns))
+            keys.append(key)
+        for key, row_dict in new_indexed_rows.items():
+            if not key in merged:
+                final_file.write(format_row(row_dict, columns))
+                keys.append(key)
+        final_file.flush()
+        os.fsync(final_file.fileno())
         final_file.close()
-        shutil.move(final_tempname, self.filename)
+        os.replace(final_tempname, self.filename)
+        write_key_index(self.filename, keys)
+
+##############################################################################
+# Each ResultsFile writes to its own journal, named after the host and process and made unique by
+# a random UUID, so that a later process that gets the same PID never reuses the journal of a
+# crashed one, and holds an advisory (POSIX, so also NFS) lock on it while it runs.  Merges into a
+# results file hold a lock on a lock file next to it.
+
+# the journals of the writers of this process, which its own POSIX locks do not exclude
+open_journals = set()
+
+def get_journal_filename(filename):
+    return '%s.journal.%s.%d.%s' % (filename, socket.gethostname(), os.getpid(),
+                                    uuid.uuid4().hex)
+
+def get_journal_filenames(filename):
+    """
+    Returns the journals of the given results file, including one named as by earlier versions.
+    """
+    path = pathlib.Path(str(filename))
+    return sorted(str(journal) for journal in path.parent.glob(path.name + '.journal*'))
+
+def get_lock_filename(filename):
+    return str(filename) + '.lock'
+
+def try_lock(f):
+    """
+    Takes an exclusive lock on the given file, which is open for writing, and returns True, or
+    returns False if another process holds a lock on it.  The lock is released when the file is
+    closed.
+    """
+    try:
+        fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+@contextlib.contextmanager
+def lock_results(filename):
+    """
+    Holds the lock on merges into the given results file, waiting for other processes to finish
+    their merges.
+    """
+    with open(get_lock_filename(filename), "a") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+def format_params(params):
+    return ";".join("%s=%s" % (k, v) for (k, v) in params.items())
+
+# FIXME: here we cross our fingers that parameters don't have "," in them.
+def split_row(row, column_names):
+    entries = row.strip().split(',')
+    return tuple(entries[:3]), dict(zip(column_names, entries))
+
+def read_indexed_rows(filename):
+    """
+    Yields the (key, row dict) of each row of the given results file in order, skipping a
+    partially written last row.  Yields nothing if the file does not exist.
+    """
+    try:
+        f = open(filename, "r")
+    except FileNotFoundError:
+        return
+    with f:
+        column_names = f.readline().strip().split(',')
+        for row in f:
+            if row.endswith('\n'):
+                yield split_row(row, column_names)
+
+def format_row(row_dict, columns):
+    return ",".join(list(row_dict.get(l, "") for l in columns)) + "\n"
+
+def read_header(filename):
+    try:
+        with open(filename, "r") as f:
+            return f.readline().strip().split(',')
+    except FileNotFoundError:
+        return None
+
+##############################################################################
+# The key index of a results file is a small SQLite database next to it, with a table of the
+# (algorithm, params, run-id) keys of its rows and a single row with the inode, size and
+# modification time of the results file it describes, and while rows are appended to it, its size
+# before the append.  It is only trusted if that row matches the results file, and it is only used
+# by merges, which hold the results file lock.
+
+def get_key_index_filename(filename):
+    return str(filename) + '.index'
+
+def get_file_state(filename):
+    stat = os.stat(str(filename))
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def open_key_index(filename):
+    """
+    Returns a connection to the key index of the given results file, or None if there is no
+    index (an earlier version wrote a text file instead) or it does not match the results file.
+    If an append to the results file was interrupted, the results file is first truncated back to
+    its size before the append.
+    """
+    indexname = get_key_index_filename(filename)
+    if not os.path.exists(indexname) or not os.path.exists(str(filename)):
+        return None
+    index = sqlite3.connect(indexname)
+    try:
+        state = index.execute("SELECT inode, size, mtime, append_size FROM state").fetchone()
+    except sqlite3.DatabaseError:
+        state = None
+    if state is not None and state[3] is not None:
+        state = undo_key_index_append(index, filename, state)
+    if state is None or state[:3] != get_file_state(filename):
+        index.close()
+        return None
+    return index
+
+def undo_key_index_append(index, filename, state):
+    """
+    Truncates the results file back to its size before the interrupted append recorded in the
+    given state of its key index, and returns the new state, or None if the results file has
+    been replaced since.
+    """
+    inode, size, mtime, append_size = state
+    stat = os.stat(str(filename))
+    if stat.st_ino != inode or stat.st_size < append_size:
+        return None
+    with open(filename, "r+") as f:
+        f.truncate(append_size)
+        f.flush()
+        os.fsync(f.fileno())
+    state = get_file_state(filename)
+    with index:
+        index.execute("UPDATE state SET inode = ?, size = ?, mtime = ?, append_size = NULL",
+                      state)
+    return state + (None,)
+
+def key_index_has_any(index, keys):
+    """
+    Returns True if any of the given keys is in the given key index.
+    """
+    for key in keys:
+        if index.execute("SELECT 1 FROM keys WHERE algorithm = ? AND params = ? AND run_id = ?",
+                         key).fetchone() is not None:
+            return True
+    return False
+
+def start_key_index_append(index):
+    with index:
+        index.execute("UPDATE state SET append_size = size")
+
+def append_key_index(index, filename, keys):
+    with index:
+        index.executemany("INSERT INTO keys VALUES (?, ?, ?)", keys)
+        index.execute("UPDATE state SET inode = ?, size = ?, mtime = ?, append_size = NULL",
+                      get_file_state(filename))
+
+def write_key_index(filename, keys):
+    indexname = get_key_index_filename(filename)
+    fd, tempname = tempfile.mkstemp(dir=os.path.dirname(indexname))
+    os.close(fd)
+    index = sqlite3.connect(tempname)
+    try:
+        with index:
+            index.execute("CREATE TABLE keys (algorithm TEXT, params TEXT, run_id TEXT, "
+                          "PRIMARY KEY (algorithm, params, run_id)) WITHOUT ROWID")
+            index.execute("CREATE TABLE state (inode INTEGER, size INTEGER, mtime INTEGER, "
+                          "append_size INTEGER)")
+            # a results file written by hand may repeat a key
+            index.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?)", keys)
+            index.execute("INSERT INTO state VALUES (?, ?, ?, NULL)", get_file_state(filename))
+    finally:
+        index.close()
+    os.replace(tempname, indexname)
+
+def ends_with_complete_row(filename):
+    """
+    Returns True if the given results file ends with a newline, i.e., its last row is complete.
+    """
+    with open(filename, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def read_finished_keys(filename):
+    """
+    Returns the set of (algorithm, run-id) pairs that have a row in the given results or journal
+    file, or the empty set if the file does not exist.
+    """
+    try:
+        f = open(filename, "r")
+    except FileNotFoundError:
+        return set()
+    keys = set()
+    with f:
+        f.readline() # skip the header
+        for row in f:
+            entries = row.split(',', 3)
+            if row.endswith('\n') and len(entries) > 2:
+                keys.add((entries[0], entries[2]))
+    return keys
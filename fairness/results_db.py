@@ -0,0 +1,132 @@
+import sqlite3
+import time
+
+import pandas as pd
+
+from fairness.results import SyncPolicy, SyncTimer, format_params, get_metrics_list, \
+                             local_results_path
+
+# The results, the per-parameter results of grid searches and the statistics of the model fits
+# (see benchmark.create_fit_stats_writer) are kept in three tables of the same long form: one row
+# per (dataset, sensitive, tag, algorithm, params, run-id, metric).
+TABLES = ['results', 'param_results', 'fit_stats']
+
+def get_database_filename():
+    return local_results_path() / 'results.db'
+
+def connect(filename=None, check_same_thread=True):
+    """
+    Opens the results database (by default ~/.fairness/results.db), creating its tables if
+    needed.  The database is in WAL mode, so that several benchmark processes can write to it
+    while it is being read, and waits for other writers instead of failing.  If
+    check_same_thread is False, the connection may be used by other threads than this one, one at
+    a time.
+    """
+    if filename is None:
+        filename = get_database_filename()
+    connection = sqlite3.connect(str(filename), timeout=60, check_same_thread=check_same_thread)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    with connection:
+        for table in TABLES:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS %s (dataset TEXT NOT NULL, sensitive TEXT NOT NULL, "
+                "tag TEXT NOT NULL, algorithm TEXT NOT NULL, params TEXT NOT NULL, "
+                "run_id INTEGER NOT NULL, metric TEXT NOT NULL, value REAL, "
+                "PRIMARY KEY (dataset, sensitive, tag, algorithm, params, run_id, metric)) "
+                "WITHOUT ROWID" % table)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS %s_by_metric ON %s (dataset, sensitive, tag, metric)" %
+                (table, table))
+    return connection
+
+class ResultsTable(object):
+    """
+    Collects result rows for one (dataset, sensitive attribute, tag) slice of a table in the
+    results database.  This is the SQLite counterpart of results.ResultsFile: rows are buffered
+    and upserted in batches, replacing earlier values for the same (algorithm, params, run-id,
+    metric), when the given SyncPolicy says so (see SyncTimer) and on close().
+
+    If resume is True, has_result() reports the (algorithm, run-id) pairs already in the slice so
+    that the caller can skip them.  The values of each row are stored under the given column
+    names, by default the metrics of the dataset and tag.
+    """
+
+    def __init__(self, table, dataset, sensitive, sensitive_dict, tag, resume=False,
+                 sync_policy=None, filename=None, columns=None):
+        self.table = table
+        self.key = (dataset.get_dataset_name(), sensitive, tag)
+        self.metrics = columns if columns is not None else \
+                       get_metrics_list(dataset, sensitive_dict, tag)
+        self.filename = filename if filename is not None else get_database_filename()
+        self.sync_policy = sync_policy if sync_policy is not None else SyncPolicy()
+        self.sync_timer = SyncTimer(self)
+        # the SyncTimer upserts from its own thread
+        self.connection = connect(self.filename, check_same_thread=False)
+        self.pending = []
+        self.unsynced_rows = 0
+        self.last_sync = time.monotonic()
+        self.finished = set()
+        if resume:
+            cursor = self.connection.execute(
+                "SELECT DISTINCT algorithm, run_id FROM %s "
+                "WHERE dataset = ? AND sensitive = ? AND tag = ?" % self.table, self.key)
+            self.finished = set((alg_name, str(run_id)) for alg_name, run_id in cursor)
+
+    def has_result(self, alg_name, run_id):
+        return (alg_name, str(run_id)) in self.finished
+
+    def write_results(self, alg_name, params, run_id, results_list):
+        params = format_params(params)
+        with self.sync_timer.lock:
+            for metric, value in zip(self.metrics, results_list):
+                self.pending.append(self.key + (alg_name, params, run_id, metric, value))
+            self.unsynced_rows += 1
+            self.sync_timer.row_written()
+
+    def sync(self):
+        with self.sync_timer.lock:
+            self.sync_timer.cancel()
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO %s (dataset, sensitive, tag, algorithm, params, "
+                    "run_id, metric, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)" % self.table,
+                    self.pending)
+            self.pending = []
+            self.unsynced_rows = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.sync_timer.lock:
+            self.sync()
+            self.connection.close()
+
+def get_results_data_frame(dataset_name, sensitive, tag, metrics=None, algorithms=None,
+                           table='results', filename=None):
+    """
+    Returns the results for the given dataset, sensitive attribute and tag as a data frame in the
+    layout of the results CSV files: the algorithm, params and run-id columns followed by one
+    column per metric, in sorted order.  If metrics or algorithms are given, only those metric
+    columns or algorithm rows are read, using the database indexes.
+    """
+    query = "SELECT algorithm, params, run_id, metric, value FROM %s " \
+            "WHERE dataset = ? AND sensitive = ? AND tag = ?" % table
+    args = [dataset_name, sensitive, tag]
+    if metrics is not None:
+        query += " AND metric IN (%s)" % ", ".join(["?"] * len(metrics))
+        args += list(metrics)
+    if algorithms is not None:
+        query += " AND algorithm IN (%s)" % ", ".join(["?"] * len(algorithms))
+        args += list(algorithms)
+    query += " ORDER BY algorithm, params, run_id"
+
+    connection = connect(filename)
+    try:
+        long_df = pd.read_sql_query(query, connection, params=args)
+    finally:
+        connection.close()
+
+    wide_df = long_df.set_index(['algorithm', 'params', 'run_id', 'metric'])['value']
+    wide_df = wide_df.unstack('metric').sort_index(axis=1).reset_index()
+    wide_df.columns.name = None
+    return wide_df.rename(columns={'run_id' : 'run-id'})
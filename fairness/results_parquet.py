@@ -0,0 +1,233 @@
+import fire
+import os
+import time
+
+import pandas as pd
+
+from fairness.results import SyncPolicy, SyncTimer, ensure_dir, format_params, \
+                             get_metrics_list, local_results_path
+
+# The results, the per-parameter results of grid searches and the statistics of the model fits
+# (see benchmark.create_fit_stats_writer) are kept in three tables, each a directory tree
+# partitioned as <table>/dataset=<d>/sensitive=<s>/tag=<t>/algorithm=<a>/.  Every sync appends a
+# new part file with the rows written since the last one, in the wide layout of the results CSV
+# files (minus the algorithm column, which is the partition), so that readers can load just the
+# metric columns they need.  Parts are never modified: a later row for the same (params, run-id)
+# replaces earlier ones when read, and compact() merges the parts of each partition.
+#
+# This needs pyarrow (the parquet extra of the package), which is only imported when the store is
+# used; check_pyarrow() checks for it up front.
+TABLES = ['results', 'param_results', 'fit_stats']
+KEY_COLUMNS = ['params', 'run-id']
+PART_PREFIX = 'part-'
+PART_SUFFIX = '.parquet'
+
+def check_pyarrow():
+    """
+    Raises an ImportError that says how to install pyarrow if it is missing, so that a run that
+    uses the store fails before it does any work instead of at its first sync.
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The parquet results store needs pyarrow, which is not installed; "
+                          "install it with 'pip install fairness[parquet]'") from e
+
+def get_store_path():
+    return local_results_path() / 'results_store'
+
+def get_partition_path(root, table, dataset_name, sensitive, tag, algorithm=None):
+    path = root / table / ('dataset=' + dataset_name) / ('sensitive=' + sensitive) / \
+           ('tag=' + tag)
+    if algorithm is not None:
+        path = path / ('algorithm=' + algorithm)
+    return path
+
+def get_algorithm_partitions(slice_path):
+    """
+    Returns the sorted list of (algorithm, path) of the algorithm partitions under the given
+    (dataset, sensitive, tag) partition.
+    """
+    if not slice_path.is_dir():
+        return []
+    return sorted((path.name.split('=', 1)[1], path) for path in slice_path.iterdir()
+                  if path.is_dir() and path.name.startswith('algorithm='))
+
+def get_parts(partition_path):
+    """
+    Returns the part files of the given partition in the order they were written.
+    """
+    return sorted(partition_path.glob(PART_PREFIX + '*' + PART_SUFFIX))
+
+def make_part_filename(partition_path):
+    # zero padded so that parts sort in the order they were written
+    return partition_path / ('%s%020d-%d%s' % (PART_PREFIX, time.time_ns(), os.getpid(),
+                                               PART_SUFFIX))
+
+def write_part(partition_path, data_frame, filename=None):
+    """
+    Writes the given rows as a new part of the given partition, by default named to sort after
+    all existing parts.  The part is written under a hidden name and renamed into place, so
+    readers never see a partial part.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    ensure_dir(partition_path)
+    if filename is None:
+        filename = make_part_filename(partition_path)
+    tempname = partition_path / ('.' + filename.name)
+    table = pyarrow.Table.from_pandas(data_frame, preserve_index=False)
+    pyarrow.parquet.write_table(table, str(tempname))
+    with open(str(tempname), 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(str(tempname), str(filename))
+    return filename
+
+def read_part(filename, columns=None):
+    """
+    Reads the given columns of a part (all of them if columns is None).  Columns that the part
+    does not have are left out, and are filled in with NaN when parts are concatenated.
+    """
+    import pyarrow.parquet
+
+    if columns is not None:
+        present = set(pyarrow.parquet.read_schema(str(filename)).names)
+        columns = [column for column in columns if column in present]
+    return pyarrow.parquet.read_table(str(filename), columns=columns).to_pandas()
+
+def read_partition(partition_path, columns=None):
+    """
+    Reads the rows of all parts of the given partition, keeping only the last row written for
+    each (params, run-id), or returns None if the partition has no parts.
+    """
+    if columns is not None:
+        columns = KEY_COLUMNS + [column for column in columns if column not in KEY_COLUMNS]
+    frames = [read_part(part, columns) for part in get_parts(partition_path)]
+    if len(frames) == 0:
+        return None
+    data_frame = pd.concat(frames, ignore_index=True, sort=False)
+    return data_frame.drop_duplicates(KEY_COLUMNS, keep='last')
+
+class ResultsStore(object):
+    """
+    Collects result rows for one (dataset, sensitive attribute, tag) slice of a table in the
+    columnar results store.  This is the counterpart of results.ResultsFile and
+    results_db.ResultsTable: rows are buffered and appended as one new part per algorithm when
+    the given SyncPolicy says so (see SyncTimer) and on close().
+
+    If resume is True, has_result() reports the (algorithm, run-id) pairs already in the slice so
+    that the caller can skip them.  The columns after the key columns are the given columns, by
+    default the metrics of the dataset and tag.
+    """
+
+    def __init__(self, table, dataset, sensitive, sensitive_dict, tag, resume=False,
+                 sync_policy=None, root=None, columns=None):
+        check_pyarrow()
+        self.root = root if root is not None else get_store_path()
+        self.filename = get_partition_path(self.root, table, dataset.get_dataset_name(),
+                                           sensitive, tag)
+        self.metrics = columns if columns is not None else \
+                       get_metrics_list(dataset, sensitive_dict, tag)
+        self.sync_policy = sync_policy if sync_policy is not None else SyncPolicy()
+        self.sync_timer = SyncTimer(self)
+        self.pending = {}
+        self.unsynced_rows = 0
+        self.last_sync = time.monotonic()
+        self.finished = set()
+        if resume:
+            for alg_name, partition_path in get_algorithm_partitions(self.filename):
+                data_frame = read_partition(partition_path, [])
+                if data_frame is not None:
+                    self.finished |= set((alg_name, str(run_id))
+                                         for run_id in data_frame['run-id'])
+
+    def has_result(self, alg_name, run_id):
+        return (alg_name, str(run_id)) in self.finished
+
+    def write_results(self, alg_name, params, run_id, results_list):
+        row = [format_params(params), run_id] + \
+              [float('nan') if result is None else result for result in results_list]
+        with self.sync_timer.lock:
+            self.pending.setdefault(alg_name, []).append(row)
+            self.unsynced_rows += 1
+            self.sync_timer.row_written()
+
+    def sync(self):
+        with self.sync_timer.lock:
+            self.sync_timer.cancel()
+            for alg_name, rows in self.pending.items():
+                data_frame = pd.DataFrame(rows, columns=KEY_COLUMNS + self.metrics)
+                data_frame[self.metrics] = data_frame[self.metrics].astype('float64')
+                write_part(self.filename / ('algorithm=' + alg_name), data_frame)
+            self.pending = {}
+            self.unsynced_rows = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+
+def get_results_data_frame(dataset_name, sensitive, tag, metrics=None, algorithms=None,
+                           table='results', root=None):
+    """
+    Returns the results for the given dataset, sensitive attribute and tag as a data frame in the
+    layout of the results CSV files: the algorithm, params and run-id columns followed by one
+    column per metric, in sorted order.  If metrics are given, only those columns are read from
+    the part files; if algorithms are given, only their partitions are read.
+    """
+    if root is None:
+        root = get_store_path()
+    slice_path = get_partition_path(root, table, dataset_name, sensitive, tag)
+    frames = []
+    for alg_name, partition_path in get_algorithm_partitions(slice_path):
+        if algorithms is not None and alg_name not in algorithms:
+            continue
+        data_frame = read_partition(partition_path, metrics)
+        if data_frame is not None:
+            data_frame.insert(0, 'algorithm', alg_name)
+            frames.append(data_frame)
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['algorithm'] + KEY_COLUMNS + list(metrics or []))
+
+    data_frame = pd.concat(frames, ignore_index=True, sort=False)
+    metric_columns = sorted(column for column in data_frame.columns
+                            if column not in ['algorithm'] + KEY_COLUMNS)
+    data_frame = data_frame.sort_values(['algorithm'] + KEY_COLUMNS)
+    return data_frame[['algorithm'] + KEY_COLUMNS + metric_columns].reset_index(drop=True)
+
+def compact(root=None):
+    """
+    Merges the parts of each partition of the store into a single part, keeping the last row
+    written for each (params, run-id).  The merged parts are only removed once the new part is in
+    place, and parts written while compacting are left for the next compaction.
+    """
+    check_pyarrow()
+    if root is None:
+        root = get_store_path()
+    for table in TABLES:
+        table_path = root / table
+        if not table_path.is_dir():
+            continue
+        for slice_path in sorted(table_path.glob('dataset=*/sensitive=*/tag=*')):
+            for alg_name, partition_path in get_algorithm_partitions(slice_path):
+                parts = get_parts(partition_path)
+                if len(parts) < 2:
+                    continue
+                frames = [read_part(part) for part in parts]
+                data_frame = pd.concat(frames, ignore_index=True, sort=False)
+                data_frame = data_frame.drop_duplicates(KEY_COLUMNS, keep='last')
+                # named after the last merged part so that it still sorts before the parts
+                # written since
+                last = parts[-1]
+                write_part(partition_path, data_frame,
+                           last.with_name(last.name[:-len(PART_SUFFIX)] + '-compacted' +
+                                          PART_SUFFIX))
+                for part in parts:
+                    part.unlink()
+                print("Compacted %d parts of %s" % (len(parts), partition_path))
+
+def main():
+    fire.Fire(compact)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import unittest
+
+import numpy
+import pandas
+
+from fairness.algorithms.kamishima.CaldersAlgorithm import CaldersAlgorithm, \
+                                                          encode_in_calders_format
+
+class TestCaldersMissingValues(unittest.TestCase):
+    def setUp(self):
+        self.train_df = pandas.DataFrame({'x': [1.0, 2.0, numpy.nan, 1.0, 2.0, 1.0],
+                                          's': [0, 1, 0, 1, 0, 1],
+                                          'y': [1, 0, 1, 1, 0, 0]})
+        self.test_df = pandas.DataFrame({'x': [numpy.nan, 2.0, 1.0],
+                                         's': [1, 0, 1],
+                                         'y': [0, 1, 1]})
+
+    def test_encoding(self):
+        train, test, lengths, class_values = \
+            encode_in_calders_format(self.train_df, self.test_df, 'y', ['s'], 's')
+        # the missing values share a code of their own after those of the other values
+        self.assertEqual(list(train[:, 0]), [0, 1, 2, 0, 1, 0])
+        self.assertEqual(list(test[:, 0]), [2, 1, 0])
+        self.assertEqual(lengths, [3])
+        self.assertEqual(list(class_values), [1, 0])
+
+    def test_run(self):
+        predictions, _ = CaldersAlgorithm().run(self.train_df, self.test_df, 'y', 1, ['s'], 's',
+                                                [1], {})
+        self.assertEqual(len(predictions), len(self.test_df))
+        self.assertTrue(set(predictions) <= set([0, 1]))
+
+if __name__ == '__main__':
+    unittest.main()
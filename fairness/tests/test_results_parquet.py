@@ -0,0 +1,57 @@
+import math
+import pathlib
+import tempfile
+import unittest
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from fairness import results_parquet
+from fairness.data.objects.Ricci import Ricci
+
+@unittest.skipIf(pyarrow is None, "the parquet results store needs pyarrow")
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tempdir.name)
+        self.partition = results_parquet.get_partition_path(self.root, 'results', 'ricci', 'Race',
+                                                            'numerical', 'SVM')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def create_store(self, resume=False):
+        return results_parquet.ResultsStore('results', Ricci(), 'Race', {}, 'numerical', resume,
+                                            root=self.root, columns=['accuracy', 'DIbinary'])
+
+    def runTest(self):
+        store = self.create_store()
+        store.write_results('SVM', {'C': 1}, 0, [0.5, 0.25])
+        store.sync()
+        # a later row for the same (params, run-id) replaces the earlier one when read
+        store.write_results('SVM', {'C': 1}, 0, [0.75, None])
+        store.write_results('SVM', {'C': 1}, 1, [0.125, 0.5])
+        store.close()
+        self.assertEqual(len(results_parquet.get_parts(self.partition)), 2)
+
+        data_frame = results_parquet.read_partition(self.partition, ['accuracy'])
+        self.assertEqual(list(data_frame.columns), ['params', 'run-id', 'accuracy'])
+        self.assertEqual(sorted(zip(data_frame['run-id'], data_frame['accuracy'])),
+                         [(0, 0.75), (1, 0.125)])
+
+        results_parquet.compact(self.root)
+        self.assertEqual(len(results_parquet.get_parts(self.partition)), 1)
+        data_frame = results_parquet.read_partition(self.partition).sort_values('run-id')
+        self.assertEqual(list(data_frame['params']), ['C=1', 'C=1'])
+        self.assertEqual(list(data_frame['accuracy']), [0.75, 0.125])
+        self.assertTrue(math.isnan(data_frame['DIbinary'].iloc[0]))
+        self.assertEqual(data_frame['DIbinary'].iloc[1], 0.5)
+
+        store = self.create_store(resume=True)
+        self.assertTrue(store.has_result('SVM', 1))
+        self.assertFalse(store.has_result('SVM', 2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,6 +20,10 @@ INSTALL_REQUIRES = [
   'ggplot'
 ]
 
+EXTRAS_REQUIRE = {
+  'parquet': ['pyarrow']
+}
+
 PACKAGES = find_packages()
 PACKAGE_DATA = {
   'fairness.data.raw' : ['*.csv','*.txt'],
@@ -42,7 +46,8 @@ ENTRY_POINTS = {
   'console_scripts': [
       'fairness-benchmark = fairness.benchmark:main',
       'fairness-preprocess = fairness.preprocess:main',
-      'fairness-analysis = fairness.analysis:main'
+      'fairness-analysis = fairness.analysis:main',
+      'fairness-compact-results = fairness.results_parquet:main'
   ],
 }
 
@@ -68,6 +73,7 @@ with open("README.md", "r") as fh:
                  "License :: OSI Approved :: Apache Software License",
                  "Operating System :: OS Independent",
                 ),
-    install_requires=INSTALL_REQUIRES
+    install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE
     )
 